@@ -4,10 +4,15 @@ from .sidebar import render_sidebar
 from .chat import render_chat_interface
 from .file_manager import render_file_manager
 from .connection_status import render_connection_status
+from .chart_gallery import render_chart_gallery
+from .styles import SIDEBAR_NAV_CSS, inject_sidebar_css
 
 __all__ = [
     'render_sidebar',
     'render_chat_interface', 
     'render_file_manager',
-    'render_connection_status'
+    'render_connection_status',
+    'render_chart_gallery',
+    'SIDEBAR_NAV_CSS',
+    'inject_sidebar_css'
 ]
\ No newline at end of file
@@ -0,0 +1,143 @@
+"""Chart gallery component for pandas-chat-app"""
+
+import streamlit as st
+from utils import ChartHandler
+
+
+_HOW_TO_CREATE_MD = """
+### How to create charts:
+1. **Upload data files** in the Files page (use sidebar to navigate)
+2. **Go to Chat page** and ask questions like:
+   - "Create a bar chart of top categories"
+   - "Show correlation heatmap"
+   - "Plot time series of sales"
+3. Charts will appear here automatically
+"""
+
+_NEED_FILES_MD = """
+#### 📁 Need to upload files?
+Use the **sidebar** to navigate to the **Files** page
+"""
+
+_READY_TO_ANALYZE_MD = """
+#### 💬 Ready to analyze?
+Use the **sidebar** to navigate to the main **Chat** page
+"""
+
+
+@st.fragment
+def render_chart_gallery(chart_handler: ChartHandler):
+    """
+    Render the gallery of generated charts, newest first.
+    
+    Runs as a fragment: the height slider, exports and deletes rerun only the
+    gallery, not the page and sidebar around it.
+    """
+    charts = st.session_state.get('generated_charts', [])
+
+    if not charts:
+        render_empty_gallery()
+        return
+
+    render_gallery_controls(chart_handler, charts)
+
+    st.divider()
+
+    # Display settings
+    display_settings = st.session_state.setdefault('chart_display_settings', {})
+    with st.expander("Display Settings"):
+        height = st.slider(
+            "Chart Height",
+            300, 800,
+            display_settings.get('height', 500),
+            step=50
+        )
+        if display_settings.get('height') != height:
+            display_settings['height'] = height
+
+    render_gallery_charts(chart_handler, charts, height)
+
+
+def render_empty_gallery():
+    """Explain how to create charts when there are none yet"""
+    st.info("No charts generated yet")
+    st.markdown(_HOW_TO_CREATE_MD)
+
+    # Navigation guidance
+    st.divider()
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.markdown(_NEED_FILES_MD)
+
+    with col2:
+        st.markdown(_READY_TO_ANALYZE_MD)
+
+
+def render_gallery_controls(chart_handler: ChartHandler, charts):
+    """Render the chart count, export and clear controls"""
+    col1, col2, col3 = st.columns([2, 1, 1])
+
+    with col1:
+        st.metric("Total Charts", len(charts))
+
+    with col2:
+        if st.button("📥 Export All", use_container_width=True):
+            html_content = chart_handler.export_all_charts()
+            if html_content:
+                st.download_button(
+                    label="Download Gallery HTML",
+                    data=html_content,
+                    file_name="chart_gallery.html",
+                    mime="text/html"
+                )
+
+    with col3:
+        if st.button("🗑️ Clear All", use_container_width=True):
+            chart_handler.clear_charts()
+            st.rerun(scope="fragment")
+
+
+def render_gallery_charts(chart_handler: ChartHandler, charts, height: int):
+    """Render each chart with its download/delete actions and details"""
+    for idx, chart in enumerate(reversed(charts)):
+        with st.container():
+            # Chart header
+            col1, col2, col3 = st.columns([3, 1, 1])
+
+            with col1:
+                st.subheader(f"{chart['chart_type'].title()}")
+                st.caption(f"Created: {chart['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}")
+
+            with col2:
+                # Download individual chart
+                st.download_button(
+                    label="📥 Download",
+                    data=chart['html'],
+                    file_name=f"{chart['chart_type']}_{chart['timestamp'].strftime('%Y%m%d_%H%M%S')}.html",
+                    mime="text/html",
+                    key=f"download_{chart['id']}"
+                )
+
+            with col3:
+                if st.button("🗑️", key=f"delete_{chart['id']}", help="Delete this chart"):
+                    del charts[len(charts) - idx - 1]
+                    st.rerun(scope="fragment")
+
+            # Display chart
+            chart_handler.display_chart(
+                chart['html'],
+                height=height,
+                key=f"chart_{chart['id']}"
+            )
+
+            # Chart metadata
+            with st.expander("Chart Details"):
+                if 'dataframe' in chart:
+                    st.write(f"**Data Source:** {chart['dataframe']}")
+                if 'metadata' in chart and chart['metadata']:
+                    st.write("**Metadata:**")
+                    for key, value in chart['metadata'].items():
+                        st.write(f"- {key}: {value}")
+
+            st.divider()
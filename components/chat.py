@@ -1,10 +1,36 @@
 """Chat interface component for pandas-chat-app"""
 
 import streamlit as st
+from collections import deque
+from itertools import islice
 from typing import List, Dict, Any
 from datetime import datetime
+import time
 from config import get_settings, get_prompt_manager
-from utils import get_logger, ChartHandler
+from utils import get_logger, get_chart_handler
+
+
+_WELCOME_MD = """
+### 👋 Welcome to Pandas Data Chat!
+
+I'm your AI data analysis assistant powered by MCP tools. I can help you:
+
+- 📊 **Analyze data** - Load CSV, Excel, JSON, or Parquet files
+- 📈 **Create visualizations** - Generate interactive charts and graphs
+- 🔍 **Explore datasets** - Run pandas operations and statistical analysis
+- 🧹 **Clean data** - Handle missing values, duplicates, and transformations
+
+**Getting Started:**
+1. Upload your data files using the file manager on the right
+2. Ask me questions about your data in natural language
+3. I'll use MCP tools to analyze and visualize your data
+
+**Example queries:**
+- "Load sales.csv and show me a summary"
+- "Create a bar chart of revenue by category"
+- "Find correlations in the dataset"
+- "Clean the data and remove duplicates"
+"""
 
 
 def render_chat_interface():
@@ -71,8 +97,14 @@ def render_message(message: Dict[str, Any], index: int):
             render_message_charts(message["chart_indices"])
 
 
+@st.fragment
 def render_message_actions(message: Dict[str, Any], index: int):
-    """Render actions for a message (copy, regenerate, etc.)"""
+    """
+    Render actions for a message (copy, regenerate, etc.)
+    
+    A fragment, so clicking an action reruns just this row instead of the
+    whole chat history and sidebar.
+    """
     
     # Create small action buttons
     col1, col2, col3, col4 = st.columns([1, 1, 1, 6])
@@ -95,7 +127,7 @@ def render_message_actions(message: Dict[str, Any], index: int):
 def render_message_charts(chart_indices: List[int]):
     """Render charts associated with a message"""
     
-    chart_handler = ChartHandler()
+    chart_handler = get_chart_handler()
     
     if not st.session_state.get('generated_charts'):
         return
@@ -118,27 +150,7 @@ def render_welcome_message():
     
     settings = get_settings()
     
-    st.markdown("""
-    ### 👋 Welcome to Pandas Data Chat!
-    
-    I'm your AI data analysis assistant powered by MCP tools. I can help you:
-    
-    - 📊 **Analyze data** - Load CSV, Excel, JSON, or Parquet files
-    - 📈 **Create visualizations** - Generate interactive charts and graphs
-    - 🔍 **Explore datasets** - Run pandas operations and statistical analysis
-    - 🧹 **Clean data** - Handle missing values, duplicates, and transformations
-    
-    **Getting Started:**
-    1. Upload your data files using the file manager on the right
-    2. Ask me questions about your data in natural language
-    3. I'll use MCP tools to analyze and visualize your data
-    
-    **Example queries:**
-    - "Load sales.csv and show me a summary"
-    - "Create a bar chart of revenue by category"
-    - "Find correlations in the dataset"
-    - "Clean the data and remove duplicates"
-    """)
+    st.markdown(_WELCOME_MD)
     
     # Show connection status
     if not st.session_state.get('mcp_tools'):
@@ -198,7 +210,8 @@ def prepare_messages_for_api(
     
     # Add recent messages (with context window)
     if st.session_state.get('messages'):
-        recent_messages = st.session_state.messages[-context_window:]
+        history = st.session_state.messages
+        recent_messages = islice(history, max(len(history) - context_window, 0), None)
         for msg in recent_messages:
             if msg["role"] in ["user", "assistant"]:
                 messages.append({
@@ -215,7 +228,7 @@ def add_user_message(content: str):
     st.session_state.messages.append({
         "role": "user",
         "content": content,
-        "timestamp": datetime.now().isoformat()
+        "timestamp": time.time_ns()
     })
     
     # Log
@@ -229,7 +242,7 @@ def add_assistant_message(content: str, chart_indices: List[int] = None):
     message = {
         "role": "assistant",
         "content": content,
-        "timestamp": datetime.now().isoformat()
+        "timestamp": time.time_ns()
     }
     
     if chart_indices:
@@ -243,6 +256,9 @@ def add_assistant_message(content: str, chart_indices: List[int] = None):
     
     # Trim messages if exceeding limit
     settings = get_settings()
-    if len(st.session_state.messages) > settings.message_history_limit:
-        # Keep system prompts and recent messages
-        st.session_state.messages = st.session_state.messages[-settings.message_history_limit:]
\ No newline at end of file
+    if getattr(st.session_state.messages, "maxlen", None) != settings.message_history_limit:
+        # Bounded deque drops the oldest messages on append
+        st.session_state.messages = deque(
+            st.session_state.messages,
+            maxlen=settings.message_history_limit
+        )
\ No newline at end of file
@@ -3,6 +3,8 @@
 import streamlit as st
 from typing import Optional, List, Dict, Any
 from datetime import datetime
+from mcp import ClientSession
+from mcp.client.sse import sse_client
 from config import get_settings
 from utils import get_logger, run_async_with_timeout
 
@@ -64,15 +66,12 @@ def connect_to_mcp_server():
     
     settings = get_settings()
     logger = get_logger()
+    mcp_url = st.session_state.get('mcp_url') or settings.mcp_sse_url
     
     with st.spinner("Connecting to MCP server..."):
         try:
-            # Import here to avoid circular imports
-            from mcp import ClientSession
-            from mcp.client.sse import sse_client
-            
             async def get_tools():
-                async with sse_client(url=settings.mcp_sse_url) as streams:
+                async with sse_client(url=mcp_url) as streams:
                     async with ClientSession(*streams) as session:
                         await session.initialize()
                         response = await session.list_tools()
@@ -99,6 +98,7 @@ def connect_to_mcp_server():
             if tools:
                 # Store tools and connection info
                 st.session_state.mcp_tools = tools
+                st.session_state.mcp_url = mcp_url
                 st.session_state.mcp_connected_at = datetime.now().isoformat()
                 
                 # Log connection
@@ -123,7 +123,7 @@ def connect_to_mcp_server():
                 
         except TimeoutError:
             st.error(f"Connection timed out after {settings.mcp_timeout} seconds")
-            logger.log("error", f"MCP connection timeout: {settings.mcp_sse_url}")
+            logger.log("error", f"MCP connection timeout: {mcp_url}")
             
         except Exception as e:
             st.error(f"Failed to connect: {str(e)}")
@@ -225,7 +225,8 @@ def display_connection_details():
             
     with col3:
         settings = get_settings()
-        st.metric("Server", settings.mcp_sse_url.split("://")[1].split("/")[0])
+        mcp_url = st.session_state.get('mcp_url') or settings.mcp_sse_url
+        st.metric("Server", mcp_url.split("://")[1].split("/")[0])
         
     # Tool list
     if st.session_state.get('mcp_tools'):
@@ -1,11 +1,14 @@
 """File management component for pandas-chat-app"""
 
+import asyncio
 import streamlit as st
 from pathlib import Path
 from typing import Dict, List, Optional
 from datetime import datetime
+from functools import lru_cache
 from config import get_settings
-from utils import get_logger
+from utils import get_logger, run_async
+from core import get_session_manager, file_text, as_file_content
 
 
 def render_file_manager():
@@ -33,65 +36,72 @@ def render_file_uploader():
     # File uploader
     uploaded_files = st.file_uploader(
         "Upload data files",
-        type=settings.allowed_file_types,
+        type=sorted(settings.allowed_file_types),
         accept_multiple_files=True,
         help=f"Max size: {settings.max_file_size_mb}MB per file"
     )
     
-    if uploaded_files:
-        for file in uploaded_files:
-            # Check if already uploaded
-            if file.name not in st.session_state.get('uploaded_files', {}):
-                # Check file size
-                file_size_mb = file.size / (1024 * 1024)
+    if not uploaded_files:
+        return
+        
+    new_files = []
+    for file in uploaded_files:
+        # Check if already uploaded
+        if file.name in st.session_state.get('uploaded_files', {}):
+            continue
+            
+        # Check file size
+        file_size_mb = file.size / (1024 * 1024)
+        
+        if file_size_mb > settings.max_file_size_mb:
+            st.error(f"❌ {file.name} exceeds {settings.max_file_size_mb}MB limit")
+            logger.log_file_operation(
+                "upload_failed",
+                file.name,
+                file.size,
+                success=False,
+                error=f"File too large: {file_size_mb:.2f}MB"
+            )
+            continue
+            
+        new_files.append(file)
+        
+    if not new_files:
+        return
+        
+    # Read (and spill) new uploads concurrently; session state is updated below
+    contents = run_async(_load_uploads(new_files))
+    
+    for file, content in zip(new_files, contents):
+        try:
+            if isinstance(content, Exception):
+                raise content
                 
-                if file_size_mb > settings.max_file_size_mb:
-                    st.error(f"❌ {file.name} exceeds {settings.max_file_size_mb}MB limit")
-                    logger.log_file_operation(
-                        "upload_failed",
-                        file.name,
-                        file.size,
-                        success=False,
-                        error=f"File too large: {file_size_mb:.2f}MB"
-                    )
-                    continue
-                    
-                try:
-                    # Read file content
-                    content = file.getvalue().decode('utf-8', errors='ignore')
-                    
-                    # Store in session state
-                    if 'uploaded_files' not in st.session_state:
-                        st.session_state.uploaded_files = {}
-                    if 'files_content' not in st.session_state:
-                        st.session_state.files_content = {}
-                        
-                    st.session_state.uploaded_files[file.name] = {
-                        'size': file.size,
-                        'type': file.type,
-                        'upload_time': datetime.now().isoformat()
-                    }
-                    st.session_state.files_content[file.name] = content
-                    
-                    st.success(f"✅ {file.name} uploaded successfully")
-                    
-                    # Log upload
-                    logger.log_file_operation(
-                        "upload",
-                        file.name,
-                        file.size,
-                        success=True
-                    )
-                    
-                except Exception as e:
-                    st.error(f"❌ Failed to upload {file.name}: {str(e)}")
-                    logger.log_file_operation(
-                        "upload_failed",
-                        file.name,
-                        file.size,
-                        success=False,
-                        error=str(e)
-                    )
+            # Store in session state (SessionManager keeps the byte count and logs the upload)
+            get_session_manager().add_file(file.name, content, {'size': file.size, 'type': file.type})
+            
+            st.success(f"✅ {file.name} uploaded successfully")
+            
+        except Exception as e:
+            st.error(f"❌ Failed to upload {file.name}: {str(e)}")
+            logger.log_file_operation(
+                "upload_failed",
+                file.name,
+                file.size,
+                success=False,
+                error=str(e)
+            )
+
+
+async def _load_uploads(files, max_concurrent: int = 8) -> list:
+    """Read uploaded files into stored content concurrently (exceptions are returned in place)"""
+    semaphore = asyncio.Semaphore(max_concurrent)
+    
+    async def load(file):
+        async with semaphore:
+            return await asyncio.to_thread(lambda: as_file_content(file.getvalue()))
+            
+    return await asyncio.gather(*(load(file) for file in files), return_exceptions=True)
 
 
 def render_uploaded_files():
@@ -118,8 +128,7 @@ def render_file_item(filename: str, info: Dict):
         icon = get_file_icon(ext)
         
         # Display filename with size
-        size_kb = info['size'] / 1024
-        st.write(f"{icon} **{filename}** ({size_kb:.1f} KB)")
+        st.write(f"{icon} **{filename}** ({_format_kb(info['size'])})")
         
     with col2:
         # Preview button
@@ -132,6 +141,12 @@ def render_file_item(filename: str, info: Dict):
             remove_file(filename)
 
 
+@lru_cache(maxsize=1024)
+def _format_kb(size: int) -> str:
+    """Format a byte count as KB (file sizes repeat on every rerun)"""
+    return f"{size / 1024:.1f} KB"
+
+
 def get_file_icon(extension: str) -> str:
     """Get icon for file type"""
     
@@ -154,39 +169,44 @@ def preview_file(filename: str):
         st.error("File content not found")
         return
         
-    content = st.session_state.files_content[filename]
+    preview, total_lines, total_chars = _file_preview(st.session_state.files_content[filename])
     
     # Show in expander
     with st.expander(f"Preview: {filename}", expanded=True):
-        # Truncate for display
-        lines = content.split('\n')[:20]
-        total_lines = len(content.split('\n'))
-        if total_lines > 20:
-            lines.append("... (truncated)")
-            
-        st.code('\n'.join(lines), language='text')
+        st.code(preview, language='text')
         
         # File info
         st.caption(f"Total lines: {total_lines}")
-        st.caption(f"Total characters: {len(content)}")
+        st.caption(f"Total characters: {total_chars}")
+
+
+def _file_preview(file_content) -> tuple:
+    """
+    Build a file's preview text and counts.
+    
+    Splits off only the first 20 lines instead of the whole file.
+    
+    Returns:
+        Tuple of (first 20 lines, total lines, total characters)
+    """
+    content = file_text(file_content)
+    
+    # Truncate for display
+    lines = content.split('\n', 20)[:20]
+    total_lines = content.count('\n') + 1
+    if total_lines > 20:
+        lines.append("... (truncated)")
+        
+    return '\n'.join(lines), total_lines, len(content)
 
 
 def remove_file(filename: str):
     """Remove a file from session state"""
     
-    logger = get_logger()
+    get_session_manager().remove_file(filename)
     
-    if filename in st.session_state.get('uploaded_files', {}):
-        del st.session_state.uploaded_files[filename]
-        
-    if filename in st.session_state.get('files_content', {}):
-        del st.session_state.files_content[filename]
-        
     st.success(f"Removed {filename}")
     
-    # Log removal
-    logger.log_file_operation("remove", filename, success=True)
-    
     st.rerun()
 
 
@@ -198,14 +218,13 @@ def render_file_stats():
         
         # Calculate stats
         total_files = len(files)
-        total_size = sum(f['size'] for f in files.values())
+        total_size = get_session_manager().total_file_size
         total_size_mb = total_size / (1024 * 1024)
         
-        # File types
-        file_types = {}
-        for filename in files.keys():
-            ext = Path(filename).suffix.lower()
-            file_types[ext] = file_types.get(ext, 0) + 1
+        # File types and recent uploads, recomputed only when the uploads change
+        file_types, recent_uploads = _upload_stats(
+            tuple((name, info.get('upload_time', '')) for name, info in files.items())
+        )
             
         # Display metrics
         col1, col2, col3 = st.columns(3)
@@ -226,20 +245,34 @@ def render_file_stats():
                 st.caption(f"  • {ext}: {count}")
                 
         # Recent uploads
-        if files:
+        if recent_uploads:
             st.caption("Recent Uploads:")
-            sorted_files = sorted(
-                files.items(),
-                key=lambda x: x[1].get('upload_time', ''),
-                reverse=True
-            )[:5]
-            
-            for filename, info in sorted_files:
-                upload_time = info.get('upload_time', '')
-                if upload_time:
-                    dt = datetime.fromisoformat(upload_time)
-                    time_str = dt.strftime("%H:%M:%S")
-                    st.caption(f"  • {filename} - {time_str}")
+            for filename, time_str in recent_uploads:
+                st.caption(f"  • {filename} - {time_str}")
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _upload_stats(uploads: tuple) -> tuple:
+    """
+    Count file types and list the 5 newest uploads.
+    
+    Args:
+        uploads: (filename, upload_time) pairs identifying the current upload set
+        
+    Returns:
+        Tuple of ({extension: count}, [(filename, "HH:MM:SS"), ...])
+    """
+    file_types = {}
+    for filename, _ in uploads:
+        ext = Path(filename).suffix.lower()
+        file_types[ext] = file_types.get(ext, 0) + 1
+        
+    recent = [
+        (filename, datetime.fromisoformat(upload_time).strftime("%H:%M:%S"))
+        for filename, upload_time in sorted(uploads, key=lambda x: x[1], reverse=True)[:5]
+        if upload_time
+    ]
+    return file_types, recent
 
 
 def get_files_for_prompt() -> str:
@@ -255,13 +288,8 @@ def get_files_for_prompt() -> str:
 def clear_all_files():
     """Clear all uploaded files"""
     
-    logger = get_logger()
-    
     count = len(st.session_state.get('uploaded_files', {}))
     
-    st.session_state.uploaded_files = {}
-    st.session_state.files_content = {}
-    
-    logger.log("info", f"Cleared {count} uploaded files")
+    get_session_manager().clear_files()
     
     return count
\ No newline at end of file
@@ -2,13 +2,28 @@
 
 import streamlit as st
 import os
-from pathlib import Path
-from typing import Optional
+import re
+import time
 from datetime import datetime
+from functools import lru_cache
 from config import get_settings, get_prompt_manager
-from utils import get_logger, clear_async_cache, run_async
-from core import MCPClient
-import hashlib
+from utils import get_logger, clear_async_cache, submit_async, get_chart_handler
+from core import get_mcp_client, get_session_manager
+
+# Model options (a tuple so it isn't rebuilt on every rerun)
+_MODELS = ("gpt-4o-mini", "gpt-4o", "gpt-4-turbo", "gpt-3.5-turbo")
+
+# Session keys cleared by "Clear All Sensitive Data"
+_SENSITIVE_KEY_RE = re.compile(r"api[_-]?key|secret|token|password", re.I)
+# Log lines that mention an API key
+_API_KEY_LOG_RE = re.compile(r"(?i:api_key)|sk-")
+
+
+@lru_cache(maxsize=4)
+def _key_format_ok(fingerprint: tuple) -> bool:
+    """Check an API key's format from its (prefix, length) fingerprint"""
+    prefix, length = fingerprint
+    return prefix == "sk-" and length > 20
 
 
 def render_sidebar():
@@ -51,6 +66,7 @@ def render_connection_config():
     """Render connection configuration with SECURE API key handling"""
     settings = get_settings()
     logger = get_logger()
+    session_manager = get_session_manager()
     
     # MCP Server Connection
     st.subheader("🔌 MCP Server")
@@ -64,35 +80,20 @@ def render_connection_config():
     # MCP URL input
     mcp_url = st.text_input(
         "SSE URL",
-        value=settings.mcp_sse_url,
+        value=st.session_state.get('mcp_url') or settings.mcp_sse_url,
         help="MCP server SSE endpoint",
         placeholder="http://localhost:8000/sse"
     )
     
     # Connect button
-    if st.button("🔄 Connect to MCP", type="primary", use_container_width=True):
-        with st.spinner("Connecting to MCP server..."):
-            try:
-                settings.mcp_sse_url = mcp_url
-                from core import MCPClient
-                mcp_client = MCPClient()
-                mcp_client.settings.mcp_sse_url = mcp_url
-                
-                async def connect():
-                    return await mcp_client.connect()
-                
-                tools = run_async(connect())
-                
-                if tools:
-                    st.session_state.mcp_tools = tools
-                    st.session_state.mcp_connected_at = datetime.now().isoformat()
-                    st.success(f"✅ Connected! {len(tools)} tools available")
-                else:
-                    st.error("No tools found on server")
-                    
-            except Exception as e:
-                st.error(f"Connection failed: {str(e)}")
-                logger.log("error", f"MCP connection failed: {str(e)}")
+    if st.session_state.get('mcp_connect_future'):
+        poll_mcp_connection()
+    elif st.button("🔄 Connect to MCP", type="primary", use_container_width=True):
+        if st.session_state.get('mcp_tools') and st.session_state.get('mcp_url') == mcp_url:
+            # Same server and already connected - skip the network round-trip
+            st.info("Already connected to this server")
+        else:
+            start_mcp_connection(mcp_url)
     
     st.divider()
     
@@ -127,11 +128,11 @@ def render_connection_config():
             
             if session_api_key:
                 # Store in session state ONLY
-                st.session_state['openai_api_key'] = session_api_key
+                session_manager.set_api_key(session_api_key)
                 st.success("✅ Using session override key")
         else:
             # Use env key in session state
-            st.session_state['openai_api_key'] = env_api_key
+            session_manager.set_api_key(env_api_key)
     else:
         # No environment key - require session input
         st.info("Enter your OpenAI API key (required each session)")
@@ -148,9 +149,9 @@ def render_connection_config():
         
         if session_api_key:
             # Validate format
-            if session_api_key.startswith("sk-") and len(session_api_key) > 20:
+            if _key_format_ok((session_api_key[:3], len(session_api_key))):
                 # Store in session state ONLY
-                st.session_state['openai_api_key'] = session_api_key
+                session_manager.set_api_key(session_api_key)
                 st.success("✅ API key set for this session")
             else:
                 st.error("Invalid API key format")
@@ -165,41 +166,98 @@ def render_connection_config():
         
         # Option to clear session key
         if st.button("🗑️ Clear Session Key", help="Remove key from this session"):
-            del st.session_state['openai_api_key']
+            session_manager.clear_api_key()
             st.success("Session key cleared")
             st.rerun()
     
     # Model selection
     model = st.selectbox(
         "Model",
-        options=[
-            "gpt-4o-mini", 
-            "gpt-4o", 
-            "gpt-4-turbo",
-            "gpt-3.5-turbo"
-        ],
+        options=_MODELS,
         index=0,
         help="OpenAI model to use"
     )
     settings.openai_model = model
     
-    # Advanced OpenAI settings
+    # Advanced OpenAI settings (buffered in a form so edits don't rerun the app)
     with st.expander("Advanced Settings"):
-        temperature = st.slider(
-            "Temperature",
-            0.0, 2.0,
-            settings.openai_temperature,
-            0.1
-        )
-        settings.openai_temperature = temperature
+        with st.form("advanced_settings"):
+            temperature = st.slider(
+                "Temperature",
+                0.0, 2.0,
+                settings.openai_temperature,
+                0.1
+            )
+
+            max_tokens = st.number_input(
+                "Max Tokens",
+                100, 4000,
+                settings.openai_max_tokens,
+                100
+            )
+
+            max_tool_calls = st.number_input(
+                "Max Tool Calls",
+                1, 50,
+                settings.max_tool_calls,
+                1
+            )
+
+            if st.form_submit_button("Apply", use_container_width=True):
+                settings.openai_temperature = temperature
+                settings.openai_max_tokens = max_tokens
+                settings.max_tool_calls = max_tool_calls
+                st.success("Settings applied")
+
+
+def start_mcp_connection(mcp_url: str):
+    """Start connecting to the MCP server in the background"""
+    settings = get_settings()
+    mcp_client = get_mcp_client(mcp_url)
+    
+    # Another session connected to this server recently - reuse its tool listing
+    tools = mcp_client.cached_tools(settings.mcp_tools_ttl)
+    if tools:
+        _store_mcp_tools(tools, mcp_url)
+        st.rerun()
+    
+    st.session_state.mcp_connect_future = submit_async(mcp_client.connect())
+    st.session_state.mcp_connect_url = mcp_url
+    st.rerun()
+
+
+def poll_mcp_connection():
+    """Check on a background MCP connection, rerunning until it finishes"""
+    logger = get_logger()
+    future = st.session_state.mcp_connect_future
+    
+    if not future.done():
+        st.info("⏳ Connecting to MCP server...")
+        time.sleep(0.2)
+        st.rerun()
+    
+    del st.session_state['mcp_connect_future']
+    mcp_url = st.session_state.pop('mcp_connect_url', None)
+    
+    try:
+        tools = future.result()
         
-        max_tokens = st.number_input(
-            "Max Tokens",
-            100, 4000,
-            settings.openai_max_tokens,
-            100
-        )
-        settings.openai_max_tokens = max_tokens
+        if tools:
+            _store_mcp_tools(tools, mcp_url)
+            st.success(f"✅ Connected! {len(tools)} tools available")
+        else:
+            st.error("No tools found on server")
+            
+    except Exception as e:
+        st.error(f"Connection failed: {str(e)}")
+        logger.log("error", f"MCP connection failed: {str(e)}")
+
+
+def _store_mcp_tools(tools, mcp_url: str):
+    """Record a server's tools as this session's connection"""
+    st.session_state.mcp_tools = tools
+    st.session_state.mcp_url = mcp_url
+    st.session_state.mcp_connected_at = datetime.now().isoformat()
 
 
 def render_prompt_config():
@@ -240,7 +298,7 @@ def render_debug_logs():
         for log in reversed(recent_logs):
             # SECURITY: Filter out any API key references
             message = log['message']
-            if 'api_key' in message.lower() or 'sk-' in message:
+            if _API_KEY_LOG_RE.search(message):
                 message = "[REDACTED - API KEY]"
             
             level = log['level']
@@ -252,6 +310,37 @@ def render_debug_logs():
                 st.caption(f"[{log['timestamp']}] {message}")
     else:
         st.info("No logs to display")
+    
+    render_tool_history()
+
+
+def render_tool_history():
+    """Render recent MCP tool calls as a single table with a detail view"""
+    tool_logs = st.session_state.get('tool_logs')
+    if not tool_logs:
+        return
+    
+    st.divider()
+    st.caption("Recent Tool Calls:")
+    
+    tool_logs = list(tool_logs)
+    st.dataframe(
+        [
+            {column: log.get(column) for column in ("timestamp", "tool", "success", "duration_ms")}
+            for log in tool_logs
+        ],
+        use_container_width=True,
+        hide_index=True,
+        height=200
+    )
+    
+    idx = st.selectbox(
+        "Inspect",
+        range(len(tool_logs)),
+        index=len(tool_logs) - 1,
+        format_func=lambda i: f"{tool_logs[i].get('timestamp', '')} {tool_logs[i].get('tool', '')}"
+    )
+    st.json(tool_logs[idx], expanded=False)
 
 
 def render_clear_controls():
@@ -261,10 +350,9 @@ def render_clear_controls():
     # Security clear option
     st.warning("🔒 **Security Clear**")
     if st.button("🔐 Clear All Sensitive Data", type="primary", use_container_width=True):
-        # Clear API keys from session
-        if 'openai_api_key' in st.session_state:
-            del st.session_state['openai_api_key']
-        # Clear any other sensitive data
+        # Clear API keys and any other sensitive data from session
+        for key in [k for k in st.session_state.keys() if _SENSITIVE_KEY_RE.search(k)]:
+            del st.session_state[key]
         st.success("All sensitive data cleared from session")
         st.info("API keys must be re-entered")
     
@@ -275,38 +363,30 @@ def render_clear_controls():
     
     with col1:
         if st.button("🗑️ Clear Chat"):
-            from core import SessionManager
-            session_manager = SessionManager()
+            session_manager = get_session_manager()
             session_manager.clear_messages()
             st.success("Chat cleared")
             st.rerun()
             
     with col2:
         if st.button("📊 Clear Charts"):
-            from utils import ChartHandler
-            ChartHandler().clear_charts()
+            get_chart_handler().clear_charts()
             st.success("Charts cleared")
             st.rerun()
     
     if st.button("📁 Clear Files", use_container_width=True):
-        from core import SessionManager
-        session_manager = SessionManager()
+        session_manager = get_session_manager()
         session_manager.clear_files()
         st.success("Files cleared")
         st.rerun()
     
     if st.button("🔄 Clear All Data", type="secondary", use_container_width=True):
         # Clear everything except API keys
-        preserved_keys = ['openai_api_key']  # Preserve during normal clear
+        preserved_keys = ('openai_api_key', '_api_key_fp')  # Preserve during normal clear
         preserved = {k: st.session_state[k] for k in preserved_keys if k in st.session_state}
         
-        for key in list(st.session_state.keys()):
-            if key not in preserved_keys:
-                del st.session_state[key]
-        
-        # Restore preserved
-        for k, v in preserved.items():
-            st.session_state[k] = v
+        st.session_state.clear()
+        st.session_state.update(preserved)
             
         clear_async_cache()
         get_logger().clear_recent()
@@ -0,0 +1,44 @@
+"""Shared CSS snippets for pandas-chat-app pages"""
+
+import streamlit as st
+
+# Built once at import instead of on every page rerun
+SIDEBAR_NAV_CSS = """
+<style>
+    /* Make sidebar page links bigger */
+    .css-w770g5 {
+        font-size: 18px !important;
+        font-weight: 500 !important;
+    }
+    
+    /* Make the page names in sidebar bigger */
+    [data-testid="stSidebarNav"] li div a {
+        font-size: 18px !important;
+        font-weight: 500 !important;
+        padding: 0.75rem 1rem !important;
+    }
+    
+    /* Make the current page highlighted better */
+    [data-testid="stSidebarNav"] li div a[aria-selected="true"] {
+        background-color: rgba(255, 255, 255, 0.1);
+        font-weight: 600 !important;
+    }
+    
+    /* Increase spacing between pages */
+    [data-testid="stSidebarNav"] li {
+        margin-bottom: 0.5rem;
+    }
+    
+    /* Style the main navigation header */
+    [data-testid="stSidebarNav"] {
+        padding-top: 1rem;
+        padding-bottom: 1rem;
+    }
+</style>
+"""
+
+
+def inject_sidebar_css():
+    """Enlarge and highlight the sidebar page links"""
+    # st.html sends the style block as-is, skipping the markdown parser
+    st.html(SIDEBAR_NAV_CSS)
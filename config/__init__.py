@@ -1,6 +1,27 @@
 """Configuration package for pandas-chat-app"""
 
-from .settings import Settings, get_settings
-from .prompt_manager import PromptManager, get_prompt_manager
+from importlib import import_module
 
-__all__ = ['Settings', 'get_settings', 'PromptManager', 'get_prompt_manager']
\ No newline at end of file
+# Submodules are imported on first attribute access (PEP 562) so pages that
+# only need settings don't pay for the prompt manager import.
+_LAZY = {
+    'Settings': 'settings',
+    'get_settings': 'settings',
+    'PromptManager': 'prompt_manager',
+    'get_prompt_manager': 'prompt_manager',
+}
+
+__all__ = ['Settings', 'get_settings', 'PromptManager', 'get_prompt_manager']
+
+
+def __getattr__(name: str):
+    if name in _LAZY:
+        module = import_module(f".{_LAZY[name]}", __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
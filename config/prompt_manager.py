@@ -1,35 +1,13 @@
 """Prompt management for system messages"""
 
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple, Set
 import streamlit as st
+from .settings import ensure_dir
 
-
-class PromptManager:
-    """Manage system prompts for the chat application"""
-    
-    def __init__(self, prompt_dir: Path = Path("config/prompts")):
-        self.prompt_dir = prompt_dir
-        self.prompt_dir.mkdir(parents=True, exist_ok=True)
-        
-        self.default_prompt_path = self.prompt_dir / "default.txt"
-        self.custom_prompt_path = self.prompt_dir / "custom.txt"
-        
-        # Create default prompt if it doesn't exist
-        self._ensure_default_prompt()
-        
-    def _ensure_default_prompt(self):
-        """Create default prompt file if it doesn't exist"""
-        if not self.default_prompt_path.exists():
-            self.default_prompt_path.write_text(self.get_default_prompt_template())
-            
-        # Create custom prompt from default if it doesn't exist
-        if not self.custom_prompt_path.exists():
-            self.custom_prompt_path.write_text(self.get_default_prompt_template())
-            
-    def get_default_prompt_template(self) -> str:
-        """Get the default system prompt template"""
-        return """You are a data analysis assistant with MCP server access.
+# Built-in system prompt; {files_info} is replaced with the uploaded files section
+_DEFAULT_PROMPT_TEMPLATE = """You are a data analysis assistant with MCP server access.
 
 {files_info}
 
@@ -65,20 +43,139 @@ class PromptManager:
    - Suggest next steps when appropriate
 
 Remember: Chain tools together to complete complex analyses. Always verify data is loaded before attempting operations."""
+
+# Shared read-only default for missing tool schema sections
+_EMPTY: Dict[str, Any] = {}
+
+_NO_FILES_SECTION = "No files have been uploaded yet. The user can upload CSV, Excel, JSON, or Parquet files for analysis."
+
+
+@lru_cache(maxsize=4)
+def _render_tools_section(entries: Tuple[Tuple[str, str, Tuple[Tuple[str, str, str], ...]], ...]) -> str:
+    """Render the tools section from (name, description, params) entries"""
+    lines = ["\n\n## Available MCP Tools:\n"]
+    for name, desc, params in entries:
+        lines.append(f"\n**{name}**:\n  {desc}\n")
+        if params:
+            lines.append("  Parameters:\n")
+            for param_name, param_type, param_desc in params:
+                lines.append(f"    - {param_name} ({param_type}): {param_desc}\n")
+    return "".join(lines)
+
+
+@lru_cache(maxsize=32)
+def _build_prompt(
+    segments: Tuple[str, ...],
+    files_info: str,
+    tools_section: str,
+    context_items: Tuple[Tuple[str, str], ...]
+) -> str:
+    """Assemble a system prompt (memoized on all of its inputs)"""
+    # Format files info
+    if files_info:
+        files_section = f"""
+IMPORTANT: The user has uploaded these files that are ready for analysis:
+{files_info}
+
+To analyze these files, you MUST:
+1. FIRST use upload_temp_file_tool with the filename to upload it to the server
+2. THEN use load_dataframe_tool with the filepath returned from the upload
+3. FINALLY use run_pandas_code_tool or other tools to analyze
+
+The file contents will be automatically injected when you call upload_temp_file_tool.
+"""
+    else:
+        files_section = _NO_FILES_SECTION
+        
+    # Replace placeholder
+    parts = [files_section.join(segments), tools_section]
+    
+    # Add any additional context
+    if context_items:
+        parts.append("\n\n## Additional Context:\n")
+        parts.append("\n".join(f"{key}: {value}" for key, value in context_items))
+            
+    return "".join(parts)
+
+
+class PromptManager:
+    """Manage system prompts for the chat application"""
+    
+    # Prompt directories whose default/custom files have been checked
+    _initialized_dirs: Set[Path] = set()
+    
+    def __init__(self, prompt_dir: Path = Path("config/prompts")):
+        self.prompt_dir = prompt_dir
+        ensure_dir(self.prompt_dir)
+        
+        self.default_prompt_path = self.prompt_dir / "default.txt"
+        self.custom_prompt_path = self.prompt_dir / "custom.txt"
+        
+        # Prompt file contents keyed by path -> (mtime_ns, text)
+        self._cache: Dict[Path, Tuple[int, str]] = {}
+        
+        # Prompt text split around {files_info}, keyed by use_custom -> (text, segments)
+        self._segments: Dict[bool, Tuple[str, Tuple[str, ...]]] = {}
+        
+        # Create default prompt if it doesn't exist
+        self._ensure_default_prompt()
+        
+    def _ensure_default_prompt(self):
+        """Create default prompt file if it doesn't exist"""
+        if self.prompt_dir in self._initialized_dirs:
+            return
+            
+        if not self.default_prompt_path.exists():
+            self.default_prompt_path.write_text(self.get_default_prompt_template(), encoding="utf-8")
+            
+        # Create custom prompt from default if it doesn't exist
+        if not self.custom_prompt_path.exists():
+            self.custom_prompt_path.write_text(self.get_default_prompt_template(), encoding="utf-8")
+            
+        self._initialized_dirs.add(self.prompt_dir)
+            
+    def get_default_prompt_template(self) -> str:
+        """Get the default system prompt template"""
+        return _DEFAULT_PROMPT_TEMPLATE
         
     def load_prompt(self, use_custom: bool = False) -> str:
         """Load prompt from file"""
         prompt_path = self.custom_prompt_path if use_custom else self.default_prompt_path
         
         try:
-            return prompt_path.read_text()
+            mtime_ns = prompt_path.stat().st_mtime_ns
+            cached = self._cache.get(prompt_path)
+            if cached and cached[0] == mtime_ns:
+                return cached[1]
+                
+            text = prompt_path.read_text(encoding="utf-8")
+            self._cache[prompt_path] = (mtime_ns, text)
+            return text
         except FileNotFoundError:
             # Fallback to default template
             return self.get_default_prompt_template()
             
+    def _load_segments(self, use_custom: bool) -> Tuple[str, ...]:
+        """Load prompt pre-split around the {files_info} placeholder"""
+        prompt = self.load_prompt(use_custom)
+        
+        # load_prompt returns the same cached object while the file is unchanged
+        cached = self._segments.get(use_custom)
+        if cached and cached[0] is prompt:
+            return cached[1]
+            
+        segments = tuple(prompt.split("{files_info}"))
+        self._segments[use_custom] = (prompt, segments)
+        return segments
+        
+    def _write_prompt(self, prompt_path: Path, prompt_text: str):
+        """Write a prompt file and refresh its cache entry"""
+        prompt_path.write_text(prompt_text, encoding="utf-8")
+        self._cache[prompt_path] = (prompt_path.stat().st_mtime_ns, prompt_text)
+            
     def save_custom_prompt(self, prompt_text: str):
         """Save custom prompt to file"""
-        self.custom_prompt_path.write_text(prompt_text)
+        self._write_prompt(self.custom_prompt_path, prompt_text)
         
     def get_formatted_prompt(
         self,
@@ -88,63 +185,42 @@ Remember: Chain tools together to complete complex analyses. Always verify data
         additional_context: Optional[Dict[str, Any]] = None
     ) -> str:
         """Get formatted prompt with context"""
-        base_prompt = self.load_prompt(use_custom)
+        segments = self._load_segments(use_custom)
+        tools_section = self._render_tools_section(tools_info) if tools_info else ""
+        context_items = tuple(
+            (str(key), str(value)) for key, value in additional_context.items()
+        ) if additional_context else ()
         
-        # Format files info
-        if files_info:
-            files_section = f"""
-IMPORTANT: The user has uploaded these files that are ready for analysis:
-{files_info}
-
-To analyze these files, you MUST:
-1. FIRST use upload_temp_file_tool with the filename to upload it to the server
-2. THEN use load_dataframe_tool with the filepath returned from the upload
-3. FINALLY use run_pandas_code_tool or other tools to analyze
-
-The file contents will be automatically injected when you call upload_temp_file_tool.
-"""
-        else:
-            files_section = "No files have been uploaded yet. The user can upload CSV, Excel, JSON, or Parquet files for analysis."
-            
-        # Replace placeholder
-        formatted = base_prompt.replace("{files_info}", files_section)
-        
-        # Add tools section
-        if tools_info:
-            formatted += "\n\n## Available MCP Tools:\n"
-            for tool in tools_info:
-                name = tool["function"]["name"]
-                desc = tool["function"].get("description", "No description")
-                params = tool["function"].get("parameters", {}).get("properties", {})
-                formatted += f"\n**{name}**:\n  {desc}\n"
-                if params:
-                    formatted += "  Parameters:\n"
-                    for param_name, param_info in params.items():
-                        param_desc = param_info.get("description", "")
-                        param_type = param_info.get("type", "")
-                        formatted += f"    - {param_name} ({param_type}): {param_desc}\n"
-        
-        # Add any additional context
-        if additional_context:
-            context_lines = []
-            for key, value in additional_context.items():
-                context_lines.append(f"{key}: {value}")
-            if context_lines:
-                formatted += "\n\n## Additional Context:\n" + "\n".join(context_lines)
-                
-        return formatted
+        return _build_prompt(segments, files_info, tools_section, context_items)
+        
+    def _render_tools_section(self, tools_info: List[Dict[str, Any]]) -> str:
+        """Render the tools section from the fields it shows (memoized on those fields)"""
+        entries = []
+        for tool in tools_info:
+            fn = tool["function"]
+            params = (fn.get("parameters") or _EMPTY).get("properties") or _EMPTY
+            entries.append((
+                fn["name"],
+                str(fn.get("description", "No description")),
+                tuple(
+                    (name, str(info.get("type", "")), str(info.get("description", "")))
+                    for name, info in params.items()
+                )
+            ))
+        return _render_tools_section(tuple(entries))
         
     def reset_custom_prompt(self):
         """Reset custom prompt to default"""
-        self.custom_prompt_path.write_text(self.get_default_prompt_template())
+        self._write_prompt(self.custom_prompt_path, self.get_default_prompt_template())
         
     def get_prompt_preview(self, use_custom: bool = False, max_lines: int = 20) -> str:
         """Get a preview of the prompt"""
         prompt = self.load_prompt(use_custom)
-        lines = prompt.split('\n')[:max_lines]
+        lines = prompt.split('\n', max_lines)
         
-        if len(prompt.split('\n')) > max_lines:
-            lines.append("... (truncated)")
+        # The remainder lands in one extra element when there are more lines
+        if len(lines) > max_lines:
+            lines[-1] = "... (truncated)"
             
         return '\n'.join(lines)
         
@@ -179,23 +255,28 @@ The file contents will be automatically injected when you call upload_temp_file_
             if use_custom:
                 # Edit custom prompt
                 st.caption("Edit Custom Prompt:")
-                edited_prompt = st.text_area(
+                
+                # Load once per session; the widget keeps its own state afterwards
+                if "prompt_edit_buffer" not in st.session_state:
+                    st.session_state.prompt_edit_buffer = self.load_prompt(True)
+                    
+                st.text_area(
                     "Custom Prompt",
-                    value=self.load_prompt(True),
                     height=400,
-                    key="prompt_edit",
-                    help="Edit your custom system prompt. Changes are saved automatically."
+                    key="prompt_edit_buffer",
+                    help="Edit your custom system prompt, then click Save Changes."
                 )
                 
                 col1, col2 = st.columns(2)
                 with col1:
                     if st.button("💾 Save Changes"):
-                        self.save_custom_prompt(edited_prompt)
+                        self.save_custom_prompt(st.session_state.prompt_edit_buffer)
                         st.success("Custom prompt saved!")
                         
                 with col2:
                     if st.button("🔄 Reset to Default"):
                         self.reset_custom_prompt()
+                        st.session_state.pop("prompt_edit_buffer", None)
                         st.success("Custom prompt reset to default!")
                         st.rerun()
             else:
@@ -206,31 +287,23 @@ The file contents will be automatically injected when you call upload_temp_file_
         default_prompt = self.load_prompt(False)
         custom_prompt = self.load_prompt(True)
         
-        default_lines = default_prompt.split('\n')
-        custom_lines = custom_prompt.split('\n')
+        default_lines = default_prompt.count('\n') + 1
+        custom_lines = custom_prompt.count('\n') + 1
         
         return {
             'default_length': len(default_prompt),
             'custom_length': len(custom_prompt),
-            'default_lines': len(default_lines),
-            'custom_lines': len(custom_lines),
+            'default_lines': default_lines,
+            'custom_lines': custom_lines,
             'is_different': default_prompt != custom_prompt,
             'length_diff': len(custom_prompt) - len(default_prompt),
-            'line_diff': len(custom_lines) - len(default_lines)
+            'line_diff': custom_lines - default_lines
         }
 
 
-# Global instance
-_prompt_manager: Optional[PromptManager] = None
-
-
+@st.cache_resource
 def get_prompt_manager() -> PromptManager:
-    """Get or create the global prompt manager instance"""
-    global _prompt_manager
-    
-    if _prompt_manager is None:
-        from .settings import get_settings
-        settings = get_settings()
-        _prompt_manager = PromptManager(settings.prompt_dir)
-        
-    return _prompt_manager
\ No newline at end of file
+    """Get or create the global prompt manager instance (shared across reruns)"""
+    from .settings import get_settings
+    settings = get_settings()
+    return PromptManager(settings.prompt_dir)
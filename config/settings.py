@@ -1,77 +1,124 @@
 """Application settings with secure API key handling"""
 
+import logging
 import os
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Set, Tuple, ClassVar, FrozenSet
 from dataclasses import dataclass, field
+from functools import partial
 from dotenv import load_dotenv
+import streamlit as st
 
 # Load environment variables
 load_dotenv()
 
+# Snapshot of the environment, read once at import
+_ENV = dict(os.environ)
 
-@dataclass
+
+def _env_str(key: str, default: str) -> str:
+    return _ENV.get(key, default)
+
+
+def _env_int(key: str, default: str) -> int:
+    return int(_ENV.get(key, default))
+
+
+def _env_float(key: str, default: str) -> float:
+    return float(_ENV.get(key, default))
+
+
+def _env_bool(key: str, default: str) -> bool:
+    return _ENV.get(key, default).lower() == "true"
+
+
+def _env_path(key: str, default: str) -> Path:
+    return Path(_ENV.get(key, default))
+
+
+def _env_set(key: str, default: str) -> FrozenSet[str]:
+    return frozenset(_ENV.get(key, default).split(','))
+
+
+# Directories already created by this process
+_ENSURED_DIRS: Set[Path] = set()
+
+
+def ensure_dir(path: Path):
+    """Create a directory once per process"""
+    if path not in _ENSURED_DIRS:
+        path.mkdir(parents=True, exist_ok=True)
+        _ENSURED_DIRS.add(path)
+
+
+@dataclass(slots=True)
 class Settings:
     """Application configuration settings - API keys are NEVER persisted"""
     
     # MCP Server Settings
-    mcp_sse_url: str = field(default_factory=lambda: os.getenv("MCP_SSE_URL", "http://119.13.110.147:8000/sse"))
-    mcp_timeout: int = field(default_factory=lambda: int(os.getenv("MCP_TIMEOUT", "30")))
-    mcp_max_retries: int = field(default_factory=lambda: int(os.getenv("MCP_MAX_RETRIES", "3")))
+    mcp_sse_url: str = field(default_factory=partial(_env_str, "MCP_SSE_URL", "http://119.13.110.147:8000/sse"))
+    mcp_timeout: int = field(default_factory=partial(_env_int, "MCP_TIMEOUT", "30"))
+    mcp_max_retries: int = field(default_factory=partial(_env_int, "MCP_MAX_RETRIES", "3"))
+    tool_cache_size: int = field(default_factory=partial(_env_int, "TOOL_CACHE_SIZE", "128"))
+    max_tool_result_chars: int = field(default_factory=partial(_env_int, "MAX_TOOL_RESULT_CHARS", "1000000"))
+    mcp_tools_ttl: int = field(default_factory=partial(_env_int, "MCP_TOOLS_TTL", "300"))
     
     # OpenAI Settings - SECURITY: Never persist API key
     # API key should ONLY come from environment or session input, NEVER saved
-    openai_model: str = field(default_factory=lambda: os.getenv("OPENAI_MODEL", "gpt-4o-mini"))
-    openai_temperature: float = field(default_factory=lambda: float(os.getenv("OPENAI_TEMPERATURE", "0.7")))
-    openai_max_tokens: int = field(default_factory=lambda: int(os.getenv("OPENAI_MAX_TOKENS", "1500")))
-    max_tool_calls: int = field(default_factory=lambda: int(os.getenv("MAX_TOOL_CALLS", "10")))
+    openai_model: str = field(default_factory=partial(_env_str, "OPENAI_MODEL", "gpt-4o-mini"))
+    openai_temperature: float = field(default_factory=partial(_env_float, "OPENAI_TEMPERATURE", "0.7"))
+    openai_max_tokens: int = field(default_factory=partial(_env_int, "OPENAI_MAX_TOKENS", "1500"))
+    max_tool_calls: int = field(default_factory=partial(_env_int, "MAX_TOOL_CALLS", "10"))
+    final_summary_budget: int = field(default_factory=partial(_env_int, "FINAL_SUMMARY_BUDGET", "8000"))
     
     # Application Settings
-    app_title: str = field(default_factory=lambda: os.getenv("APP_TITLE", "Pandas Data Chat"))
-    app_icon: str = field(default_factory=lambda: os.getenv("APP_ICON", "🐼"))
-    app_layout: str = field(default_factory=lambda: os.getenv("APP_LAYOUT", "wide"))
+    app_title: str = field(default_factory=partial(_env_str, "APP_TITLE", "Pandas Data Chat"))
+    app_icon: str = field(default_factory=partial(_env_str, "APP_ICON", "🐼"))
+    app_layout: str = field(default_factory=partial(_env_str, "APP_LAYOUT", "wide"))
     
     # File Settings
-    max_file_size_mb: int = field(default_factory=lambda: int(os.getenv("MAX_FILE_SIZE_MB", "100")))
-    allowed_file_types: list = field(default_factory=lambda: os.getenv(
-        "ALLOWED_FILE_TYPES", 
-        "csv,tsv,json,xlsx,xls,parquet"
-    ).split(','))
-    temp_dir: Path = field(default_factory=lambda: Path(os.getenv("TEMP_DIR", "temp")))
+    max_file_size_mb: int = field(default_factory=partial(_env_int, "MAX_FILE_SIZE_MB", "100"))
+    allowed_file_types: FrozenSet[str] = field(default_factory=partial(_env_set, "ALLOWED_FILE_TYPES", "csv,tsv,json,xlsx,xls,parquet"))
+    temp_dir: Path = field(default_factory=partial(_env_path, "TEMP_DIR", "temp"))
+    file_spill_bytes: int = field(default_factory=partial(_env_int, "FILE_SPILL_BYTES", "8388608"))
     
     # Logging Settings
-    log_level: str = field(default_factory=lambda: os.getenv("LOG_LEVEL", "INFO"))
-    log_dir: Path = field(default_factory=lambda: Path(os.getenv("LOG_DIR", "logs")))
-    log_max_bytes: int = field(default_factory=lambda: int(os.getenv("LOG_MAX_BYTES", "10485760")))
-    log_backup_count: int = field(default_factory=lambda: int(os.getenv("LOG_BACKUP_COUNT", "5")))
+    log_level: str = field(default_factory=partial(_env_str, "LOG_LEVEL", "INFO"))
+    log_dir: Path = field(default_factory=partial(_env_path, "LOG_DIR", "logs"))
+    log_max_bytes: int = field(default_factory=partial(_env_int, "LOG_MAX_BYTES", "10485760"))
+    log_backup_count: int = field(default_factory=partial(_env_int, "LOG_BACKUP_COUNT", "5"))
     
     # UI Settings
-    sidebar_state: str = field(default_factory=lambda: os.getenv("SIDEBAR_STATE", "expanded"))
-    theme: str = field(default_factory=lambda: os.getenv("THEME", "light"))
-    show_debug: bool = field(default_factory=lambda: os.getenv("SHOW_DEBUG", "false").lower() == "true")
+    sidebar_state: str = field(default_factory=partial(_env_str, "SIDEBAR_STATE", "expanded"))
+    theme: str = field(default_factory=partial(_env_str, "THEME", "light"))
+    show_debug: bool = field(default_factory=partial(_env_bool, "SHOW_DEBUG", "false"))
     
     # Chart Settings
-    chart_height: int = field(default_factory=lambda: int(os.getenv("CHART_HEIGHT", "500")))
-    chart_expand_default: bool = field(default_factory=lambda: os.getenv("CHART_EXPAND_DEFAULT", "true").lower() == "true")
-    max_charts_stored: int = field(default_factory=lambda: int(os.getenv("MAX_CHARTS_STORED", "20")))
+    chart_height: int = field(default_factory=partial(_env_int, "CHART_HEIGHT", "500"))
+    chart_expand_default: bool = field(default_factory=partial(_env_bool, "CHART_EXPAND_DEFAULT", "true"))
+    max_charts_stored: int = field(default_factory=partial(_env_int, "MAX_CHARTS_STORED", "20"))
     
     # Session Settings
-    message_history_limit: int = field(default_factory=lambda: int(os.getenv("MESSAGE_HISTORY_LIMIT", "50")))
-    context_window: int = field(default_factory=lambda: int(os.getenv("CONTEXT_WINDOW", "6")))
+    message_history_limit: int = field(default_factory=partial(_env_int, "MESSAGE_HISTORY_LIMIT", "50"))
+    context_window: int = field(default_factory=partial(_env_int, "CONTEXT_WINDOW", "6"))
     
     # Prompt Settings
-    prompt_dir: Path = field(default_factory=lambda: Path("config/prompts"))
-    use_custom_prompt: bool = field(default_factory=lambda: os.getenv("USE_CUSTOM_PROMPT", "false").lower() == "true")
+    prompt_dir: Path = field(default_factory=partial(Path, "config/prompts"))
+    use_custom_prompt: bool = field(default_factory=partial(_env_bool, "USE_CUSTOM_PROMPT", "false"))
     
     # SECURITY: Private property for API key - never saved
     _openai_api_key: Optional[str] = field(default=None, init=False, repr=False)
     
+    # Field names safe to export/update (populated after the class is built)
+    _SAFE_FIELDS: ClassVar[Tuple[str, ...]]
+    _ALLOWED_UPDATE_FIELDS: ClassVar[FrozenSet[str]]
+    
     def __post_init__(self):
         """Initialize directories after dataclass creation"""
-        self.temp_dir.mkdir(parents=True, exist_ok=True)
-        self.log_dir.mkdir(parents=True, exist_ok=True)
-        self.prompt_dir.mkdir(parents=True, exist_ok=True)
-        (self.temp_dir / "uploads").mkdir(parents=True, exist_ok=True)
+        ensure_dir(self.temp_dir)
+        ensure_dir(self.log_dir)
+        ensure_dir(self.prompt_dir)
+        ensure_dir(self.temp_dir / "uploads")
     
     @property
     def openai_api_key(self) -> Optional[str]:
@@ -83,7 +130,6 @@ class Settings:
     def openai_api_key(self, value: str):
         """SECURITY: Prevent setting API key on settings object"""
         # Log warning but don't store
-        import logging
         logging.warning("Attempted to set API key on settings object - ignored for security")
         # Do NOT store the value
         pass
@@ -94,39 +140,30 @@ class Settings:
     
     def update_from_dict(self, config: Dict[str, Any]):
         """Update settings from dictionary - EXCLUDES API keys"""
+        # SECURITY: Only public, non-secret fields are in the allowlist
         for key, value in config.items():
-            # SECURITY: Never update API key fields
-            if 'api_key' in key.lower() or 'secret' in key.lower():
-                continue
-            if hasattr(self, key):
+            if key in self._ALLOWED_UPDATE_FIELDS:
                 setattr(self, key, value)
     
     def to_dict(self) -> Dict[str, Any]:
         """Convert settings to dictionary - EXCLUDES sensitive data"""
-        result = {}
-        for key in self.__dataclass_fields__.keys():
-            # SECURITY: Exclude API keys and secrets from dict
-            if 'api_key' in key.lower() or 'secret' in key.lower() or key.startswith('_'):
-                continue
-            result[key] = getattr(self, key)
-        return result
+        return {key: getattr(self, key) for key in self._SAFE_FIELDS}
     
     def save_to_env(self, env_file: str = ".env"):
         """Save settings to .env file - NEVER saves API keys"""
         env_path = Path(env_file)
         
         # Read existing env file
-        existing_lines = []
-        if env_path.exists():
-            with open(env_path, 'r') as f:
-                existing_lines = f.readlines()
+        existing_lines = env_path.read_text(encoding="utf-8").splitlines() if env_path.exists() else []
         
-        # Create a dict of existing keys
-        existing_keys = {}
+        # Existing lines keyed by variable name (dicts keep file order)
+        merged = {}
         for line in existing_lines:
-            if '=' in line and not line.strip().startswith('#'):
-                key = line.split('=')[0].strip()
-                existing_keys[key] = line
+            if line.strip().startswith('#'):
+                continue
+            key, sep, _ = line.partition('=')
+            if sep:
+                merged[key.strip()] = line
         
         # Settings to save - EXCLUDES API KEYS
         settings_dict = {
@@ -142,8 +179,9 @@ class Settings:
             "APP_ICON": self.app_icon,
             "APP_LAYOUT": self.app_layout,
             "MAX_FILE_SIZE_MB": str(self.max_file_size_mb),
-            "ALLOWED_FILE_TYPES": ','.join(self.allowed_file_types),
+            "ALLOWED_FILE_TYPES": ','.join(sorted(self.allowed_file_types)),
             "TEMP_DIR": str(self.temp_dir),
+            "FILE_SPILL_BYTES": str(self.file_spill_bytes),
             "LOG_LEVEL": self.log_level,
             "LOG_DIR": str(self.log_dir),
             "LOG_MAX_BYTES": str(self.log_max_bytes),
@@ -159,38 +197,39 @@ class Settings:
             "USE_CUSTOM_PROMPT": str(self.use_custom_prompt).lower()
         }
         
-        # Build new env file content
-        new_lines = []
+        # Merge settings over existing values in a single pass
         for key, value in settings_dict.items():
-            new_lines.append(f"{key}={value}\n")
+            merged[key] = f"{key}={value}"
+        
+        # SECURITY: Never write the API key back as an active line
+        api_key_line = merged.pop("OPENAI_API_KEY", None)
+        new_lines = list(merged.values())
         
         # Preserve existing API key line if it exists (user added it manually)
-        if "OPENAI_API_KEY" in existing_keys:
+        if api_key_line:
             # Keep the existing line but commented out with warning
-            new_lines.append("# OPENAI_API_KEY should be set as environment variable, not in file\n")
-            new_lines.append("# " + existing_keys["OPENAI_API_KEY"])
+            new_lines.append("# OPENAI_API_KEY should be set as environment variable, not in file")
+            new_lines.append("# " + api_key_line)
         
-        # Write back
-        with open(env_path, 'w') as f:
-            f.writelines(new_lines)
+        # Write back in a single call
+        env_path.write_text("\n".join(new_lines) + "\n", encoding="utf-8")
 
 
-# Global settings instance
-_settings: Optional[Settings] = None
+# SECURITY: Exclude API keys, secrets and private fields from exports and updates
+Settings._SAFE_FIELDS = tuple(
+    key for key in Settings.__dataclass_fields__
+    if 'api_key' not in key.lower() and 'secret' not in key.lower() and not key.startswith('_')
+)
+Settings._ALLOWED_UPDATE_FIELDS = frozenset(Settings._SAFE_FIELDS)
 
 
+@st.cache_resource
 def get_settings() -> Settings:
-    """Get or create the global settings instance"""
-    global _settings
-    
-    if _settings is None:
-        _settings = Settings()
-    
-    return _settings
+    """Get or create the global settings instance (shared across reruns)"""
+    return Settings()
 
 
 def reset_settings():
     """Reset settings to defaults - clears everything"""
-    global _settings
-    _settings = Settings()
-    return _settings
+    get_settings.clear()
+    return get_settings()
@@ -1,11 +1,16 @@
 """Core business logic package for pandas-chat-app"""
 
-from .mcp_client import MCPClient
-from .openai_handler import OpenAIHandler
-from .session import SessionManager
+from .mcp_client import MCPClient, get_mcp_client
+from .openai_handler import OpenAIHandler, get_openai_handler
+from .session import SessionManager, get_session_manager, file_text, as_file_content
 
 __all__ = [
     'MCPClient',
+    'get_mcp_client',
     'OpenAIHandler',
-    'SessionManager'
+    'get_openai_handler',
+    'SessionManager',
+    'get_session_manager',
+    'file_text',
+    'as_file_content'
 ]
\ No newline at end of file
@@ -1,64 +1,289 @@
 """MCP client wrapper for pandas-chat-app"""
 
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
+import asyncio
+import hashlib
+from contextvars import ContextVar
 import json
+import re
 from datetime import datetime
 import time
+import anyio
+import httpx
+import streamlit as st
 from mcp import ClientSession
 from mcp.client.sse import sse_client
 from config import get_settings
-from utils import get_logger, ChartHandler
+from utils import get_logger, get_chart_handler, json_loads, json_dumps
+
+
+# Category name -> keyword matcher, checked in order (first match wins)
+_CATEGORY_PATTERNS = tuple(
+    (category, re.compile("|".join(map(re.escape, keywords))))
+    for category, keywords in (
+        ("Data Loading", ("load", "read", "upload", "preview")),
+        ("Data Analysis", ("pandas", "validate", "execution", "metadata")),
+        ("Visualization", ("chart", "visualization", "plot", "graph", "heatmap")),
+        ("File Management", ("file", "temp", "format")),
+        ("Session Management", ("session", "clear", "info")),
+    )
+)
+
+# Errors meaning the session's transport is gone (not that the tool itself failed)
+_TRANSPORT_ERRORS = (
+    anyio.ClosedResourceError,
+    anyio.BrokenResourceError,
+    anyio.EndOfStream,
+    ConnectionError,
+    httpx.TransportError,
+)
+
+# Marker appended to tool results cut short by parse_result
+_TRUNCATED = "\n...(truncated)"
+
+# Schema keys that only carry container maps of sub-schemas
+_SCHEMA_MAPS = frozenset({"properties", "$defs", "definitions", "patternProperties"})
+
+
+def minify_schema(schema: Any) -> Any:
+    """Strip null values and generated titles from a JSON schema"""
+    if isinstance(schema, dict):
+        return {
+            key: (
+                {name: minify_schema(sub) for name, sub in value.items()}
+                if key in _SCHEMA_MAPS and isinstance(value, dict)
+                else minify_schema(value)
+            )
+            for key, value in schema.items()
+            if value is not None and key != "title"
+        }
+    if isinstance(schema, list):
+        return [minify_schema(item) for item in schema]
+    return schema
+
+
+def hash_tools(tools: List[Dict[str, Any]]) -> str:
+    """Content hash of a tool list, used to tell when tool schemas changed"""
+    canonical = json.dumps(tools, sort_keys=True, default=str).encode()
+    return hashlib.blake2b(canonical, digest_size=16).hexdigest()
+
+class ToolResult(str):
+    """Tool result text that also carries chart info parsed from it"""
+    
+    __slots__ = ("chart_info",)
+    
+    def __new__(cls, text: str, chart_info: Optional[Dict[str, Any]] = None):
+        result = super().__new__(cls, text)
+        result.chart_info = chart_info
+        return result
+
+
+# This session's (result cache, cache stats), bound on the script thread so
+# tool calls running on the background loop can reach them
+_session_cache: ContextVar[Optional[Tuple[Dict, Dict[str, int]]]] = ContextVar(
+    "mcp_session_cache", default=None
+)
 
 
 class MCPClient:
     """Handle MCP server connections and tool calls"""
     
-    def __init__(self):
+    # Server-side aggregator tool that runs several operations in one request
+    BATCH_TOOL = "batch_execute"
+    
+    def __init__(self, url: Optional[str] = None):
         self.settings = get_settings()
+        # Server this client talks to (kept per instance; the shared settings only supply the default)
+        self.url = url or self.settings.mcp_sse_url
         self.logger = get_logger()
-        self.chart_handler = ChartHandler()
+        self.chart_handler = get_chart_handler()
         self.tools: List[Dict[str, Any]] = []
+        self.tools_hash: Optional[str] = None
+        self._tool_by_name: Dict[str, Dict[str, Any]] = {}
+        self._tool_names: frozenset = frozenset()
         self.connected = False
         self.connection_time: Optional[datetime] = None
+        self._has_batch = False
+        self._categories_cache: Optional[Dict[str, List[str]]] = None
+        
+        # Tools whose result depends only on their arguments - safe to memoize
+        self._cacheable_tools = frozenset({
+            "preview_file_tool",
+            "validate_pandas_code_tool",
+        })
+        
+        # Tools whose results are kept whole: batch responses are split later and
+        # chart HTML (plotly.js embedded) must stay valid JSON. Text bound for the
+        # model or the log is truncated where it is used.
+        self._untruncated_tools = frozenset({
+            self.BATCH_TOOL,
+            "get_chart_html_tool",
+        }) | self.chart_handler.chart_tools
+        
+        # Persistent session state (bound to the event loop that opened it)
+        self._session: Optional[ClientSession] = None
+        self._session_url: Optional[str] = None
+        self._session_task: Optional[asyncio.Task] = None
+        self._session_closing: Optional[asyncio.Event] = None
+        self._session_lock: Optional[asyncio.Lock] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
         
     async def connect(self) -> List[Dict[str, Any]]:
         """Connect to MCP server and retrieve tools"""
         try:
-            async with sse_client(url=self.settings.mcp_sse_url) as streams:
-                async with ClientSession(*streams) as session:
-                    await session.initialize()
-                    response = await session.list_tools()
-                    
-                    self.tools = []
-                    for tool in response.tools:
-                        self.tools.append({
-                            "type": "function",
-                            "function": {
-                                "name": tool.name,
-                                "description": tool.description or f"Tool: {tool.name}",
-                                "parameters": tool.inputSchema if tool.inputSchema else {
-                                    "type": "object",
-                                    "properties": {},
-                                    "required": []
-                                }
-                            }
-                        })
-                    
-                    self.connected = True
-                    self.connection_time = datetime.now()
-                    
-                    self.logger.log(
-                        "info",
-                        f"Connected to MCP server: {len(self.tools)} tools available"
-                    )
-                    
-                    return self.tools
+            # The client is shared by every session on this URL - reuse its live
+            # session and only reconnect if that session has failed
+            session = await self._ensure_session()
+            try:
+                response = await session.list_tools()
+            except _TRANSPORT_ERRORS as e:
+                self.logger.log("warning", f"MCP session lost, reconnecting: {str(e)}")
+                await self._discard_session(session)
+                session = await self._ensure_session()
+                response = await session.list_tools()
+            
+            # Build the new listing aside, then swap it in for concurrent readers
+            tools = []
+            for tool in response.tools:
+                tools.append({
+                    "type": "function",
+                    "function": {
+                        "name": tool.name,
+                        "description": tool.description or f"Tool: {tool.name}",
+                        "parameters": minify_schema(tool.inputSchema) if tool.inputSchema else {
+                            "type": "object",
+                            "properties": {},
+                            "required": []
+                        }
+                    }
+                })
+            tool_by_name = {tool["function"]["name"]: tool for tool in tools}
+            
+            self.tools = tools
+            self.tools_hash = hash_tools(tools)
+            self._tool_by_name = tool_by_name
+            self._tool_names = frozenset(tool_by_name)
+            self._has_batch = self.BATCH_TOOL in self._tool_names
+            self._categories_cache = None
+            self.connected = True
+            self.connection_time = datetime.now()
+            
+            self.logger.log(
+                "info",
+                f"Connected to MCP server: {len(self.tools)} tools available"
+            )
+            
+            return self.tools
                     
         except Exception as e:
             self.logger.log("error", f"Failed to connect to MCP: {str(e)}")
             self.connected = False
             raise
             
+    def cached_tools(self, max_age: float) -> Optional[List[Dict[str, Any]]]:
+        """Tools from the last connect, if it's recent and its session is still open"""
+        if not (self.connected and self.tools and self._session is not None and self.connection_time):
+            return None
+        if self._session_url != self.url:
+            return None
+        if (datetime.now() - self.connection_time).total_seconds() > max_age:
+            return None
+        return self.tools
+        
+    async def _ensure_session(self) -> ClientSession:
+        """Get the persistent session for the running loop, opening it if needed"""
+        loop = asyncio.get_running_loop()
+        if self._session_loop is not loop:
+            # Sessions and locks from another (possibly closed) loop can't be reused
+            self._abandon_session()
+            self._session_lock = asyncio.Lock()
+            self._session_loop = loop
+            
+        async with self._session_lock:
+            if (
+                self._session is not None
+                and self._session_url == self.url
+                and not self._session_task.done()
+            ):
+                return self._session
+                
+            await self._close_session()
+            
+            ready = loop.create_future()
+            self._session_closing = asyncio.Event()
+            self._session_url = self.url
+            self._session_task = loop.create_task(
+                self._run_session(self._session_url, ready, self._session_closing)
+            )
+            self._session = await ready
+            return self._session
+            
+    async def _run_session(
+        self,
+        url: str,
+        ready: asyncio.Future,
+        closing: asyncio.Event
+    ):
+        """Own the SSE transport and session so they are entered and exited in one task"""
+        try:
+            async with sse_client(url=url) as streams:
+                async with ClientSession(*streams) as session:
+                    await session.initialize()
+                    ready.set_result(session)
+                    await closing.wait()
+        except asyncio.CancelledError:
+            if not ready.done():
+                ready.cancel()
+            raise
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+            else:
+                self.logger.log("warning", f"MCP session closed: {str(e)}")
+                
+    async def _close_session(self):
+        """Close the current session task, if any"""
+        task = self._session_task
+        if task is not None and not task.done():
+            self._session_closing.set()
+            try:
+                await task
+            except Exception:
+                pass
+        self._session = None
+        self._session_task = None
+        
+    async def _discard_session(self, stale: ClientSession):
+        """Drop a session that failed, unless another call already replaced it"""
+        async with self._session_lock:
+            if self._session is stale:
+                await self._close_session()
+                
+    async def aclose(self):
+        """Close the persistent MCP session"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+            
+        if self._session_loop is loop and self._session_lock is not None:
+            async with self._session_lock:
+                await self._close_session()
+        else:
+            self._abandon_session()
+            
+    def _abandon_session(self):
+        """Drop a session owned by another event loop, asking that loop to close it"""
+        task, closing, loop = self._session_task, self._session_closing, self._session_loop
+        if task is not None and closing is not None and loop is not None:
+            try:
+                loop.call_soon_threadsafe(closing.set)
+            except RuntimeError:
+                # The loop is already closed, and its tasks with it
+                pass
+        self._session = None
+        self._session_task = None
+        
     async def call_tool(
         self,
         tool_name: str,
@@ -68,42 +293,52 @@ class MCPClient:
         
         start_time = time.time()
         
+        cache_key = None
+        if tool_name in self._cacheable_tools:
+            cache_key = self._cache_key(tool_name, params)
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                self.logger.log("info", f"Tool cache hit: {tool_name}")
+                return cached
+        
         try:
-            async with sse_client(url=self.settings.mcp_sse_url) as streams:
-                async with ClientSession(*streams) as session:
-                    await session.initialize()
-                    result = await session.call_tool(tool_name, params)
-                    
-                    # Parse result
-                    result_str = self.parse_result(result)
-                    
-                    # Calculate duration
-                    duration_ms = (time.time() - start_time) * 1000
-                    
-                    # Log the call
-                    self.logger.log_mcp_call(
-                        tool_name,
-                        params,
-                        result_str,
-                        duration_ms,
-                        success=True
-                    )
-                    
-                    # Check if this is a chart creation
-                    chart_info = self.chart_handler.detect_chart_in_response(
-                        tool_name,
-                        result_str
-                    )
-                    
-                    if chart_info:
-                        self.logger.log_chart_creation(
-                            chart_info['chart_type'],
-                            chart_info.get('dataframe', 'unknown'),
-                            chart_info['filepath'],
-                            chart_info.get('metadata')
-                        )
-                    
-                    return result_str
+            session = await self._ensure_session()
+            try:
+                result = await session.call_tool(tool_name, params)
+            except _TRANSPORT_ERRORS as e:
+                # The shared session's connection dropped - reconnect and retry once.
+                # Tool errors and timeouts are not retried: the session is still
+                # serving other calls, and the tool may already have run.
+                self.logger.log("warning", f"MCP session lost, reconnecting: {str(e)}")
+                await self._discard_session(session)
+                session = await self._ensure_session()
+                result = await session.call_tool(tool_name, params)
+            
+            # Parse result (batch and chart results are kept whole)
+            result_str = self.parse_result(
+                result,
+                max_chars=None if tool_name in self._untruncated_tools else self.settings.max_tool_result_chars
+            )
+            
+            # Calculate duration
+            duration_ms = (time.time() - start_time) * 1000
+            
+            # Log the call
+            self.logger.log_mcp_call(
+                tool_name,
+                params,
+                result_str,
+                duration_ms,
+                success=True
+            )
+            
+            # Check if this is a chart creation
+            result_str = self._with_chart_info(tool_name, result_str)
+            
+            if cache_key is not None and not getattr(result, 'isError', False):
+                self._cache_put(cache_key, result_str)
+            
+            return result_str
                     
         except Exception as e:
             duration_ms = (time.time() - start_time) * 1000
@@ -120,59 +355,175 @@ class MCPClient:
             
             return error_msg
             
-    def parse_result(self, result) -> str:
-        """Parse MCP tool call results"""
+    def _cache_key(self, tool_name: str, params: Dict[str, Any]) -> Tuple[str, str]:
+        """Build a result cache key from the tool name and canonical arguments"""
+        canonical = json.dumps(params, sort_keys=True, default=str).encode()
+        return tool_name, hashlib.blake2b(canonical, digest_size=16).hexdigest()
+        
+    def _with_chart_info(self, tool_name: str, result_str: str) -> str:
+        """Detect and log a created chart, attaching its info to the result"""
+        chart_info = self.chart_handler.detect_chart_in_response(tool_name, result_str)
+        if not chart_info:
+            return result_str
+            
+        self.logger.log_chart_creation(
+            chart_info['chart_type'],
+            chart_info.get('dataframe', 'unknown'),
+            chart_info['filepath'],
+            chart_info.get('metadata')
+        )
+        return ToolResult(result_str, chart_info)
+        
+    def bind_session_cache(self):
+        """Bind the current session's result cache for calls submitted from this thread"""
+        _session_cache.set((
+            st.session_state.setdefault("async_cache", {}),
+            st.session_state.setdefault("tool_cache_stats", {"hits": 0, "misses": 0})
+        ))
+        
+    def _cache_get(self, key: Tuple[str, str]) -> Optional[str]:
+        """Look up a cached tool result, marking it most recently used"""
+        bound = _session_cache.get()
+        if bound is None:
+            return None
+        cache, stats = bound
+        
+        result = cache.pop(key, None)
+        if result is None:
+            stats["misses"] += 1
+            return None
+            
+        cache[key] = result
+        stats["hits"] += 1
+        return result
+        
+    def _cache_put(self, key: Tuple[str, str], result: str):
+        """Store a tool result, evicting the least recently used entries"""
+        bound = _session_cache.get()
+        if bound is None:
+            return
+        cache = bound[0]
+        cache[key] = result
+        while len(cache) > self.settings.tool_cache_size:
+            del cache[next(iter(cache))]
+            
+    async def call_tools_batch(
+        self,
+        calls: List[Tuple[str, Dict[str, Any]]]
+    ) -> List[str]:
+        """Call several tools, in one batch_execute request when the server supports it
+        
+        Results are returned in call order. Falls back to concurrent calls only if
+        the batch request was never sent; once the server may have run the batch,
+        a failed or unreadable response becomes an error result for every call
+        rather than running (possibly side-effecting) tools twice.
+        """
+        if self._has_batch and len(calls) > 1:
+            try:
+                await self._ensure_session()
+            except Exception as e:
+                self.logger.log("warning", f"MCP session unavailable, calling tools individually: {str(e)}")
+            else:
+                payload = {
+                    "operations": [
+                        {"tool": tool_name, "arguments": params}
+                        for tool_name, params in calls
+                    ],
+                    "maxConcurrent": len(calls),
+                    "stopOnError": False
+                }
+                response = await self.call_tool(self.BATCH_TOOL, payload)
+                results = self.parse_batch_result(response, len(calls))
+                if results is None:
+                    self.logger.log("warning", "Unexpected batch_execute response, not retrying its calls")
+                    error = response if response.startswith("Error:") else "Error: unparseable batch response"
+                    return [error] * len(calls)
+                return [
+                    self._with_chart_info(tool_name, result_str)
+                    for (tool_name, _), result_str in zip(calls, results)
+                ]
+            
+        results = await asyncio.gather(
+            *(self.call_tool(tool_name, params) for tool_name, params in calls),
+            return_exceptions=True
+        )
+        return [
+            f"Error: {str(result)}" if isinstance(result, BaseException) else result
+            for result in results
+        ]
+        
+    def parse_batch_result(self, response: str, expected: int) -> Optional[List[str]]:
+        """Split a batch_execute response into per-call result strings"""
+        try:
+            data = json_loads(response)
+        except (TypeError, ValueError):
+            return None
+            
+        items = data.get("results") if isinstance(data, dict) else data
+        if not isinstance(items, list) or len(items) != expected:
+            return None
+            
+        results = []
+        for item in items:
+            if isinstance(item, dict) and item.get("error"):
+                results.append(f"Error: {item['error']}")
+                continue
+            value = item.get("result", item) if isinstance(item, dict) else item
+            results.append(value if isinstance(value, str) else json_dumps(value))
+        return results
+        
+    def parse_result(self, result, max_chars: Optional[int] = None) -> str:
+        """Parse MCP tool call results, stopping once max_chars have been read"""
         if hasattr(result, 'content'):
             content = result.content
             if isinstance(content, list):
-                text = ""
+                parts = []
+                remaining = max_chars
                 for item in content:
-                    if hasattr(item, 'text'):
-                        text += item.text
-                    else:
-                        text += str(item)
-                return text
+                    text = item.text if hasattr(item, 'text') else str(item)
+                    if remaining is not None:
+                        if len(text) > remaining:
+                            parts.append(text[:remaining])
+                            parts.append(_TRUNCATED)
+                            break
+                        remaining -= len(text)
+                    parts.append(text)
+                return "".join(parts)
             elif hasattr(content, 'text'):
-                return content.text
+                text = content.text
             else:
-                return str(content)
-        return str(result)
+                text = str(content)
+        else:
+            text = str(result)
+            
+        if max_chars is not None and len(text) > max_chars:
+            return text[:max_chars] + _TRUNCATED
+        return text
         
     def get_tool_by_name(self, tool_name: str) -> Optional[Dict[str, Any]]:
         """Get tool definition by name"""
-        for tool in self.tools:
-            if tool["function"]["name"] == tool_name:
-                return tool
-        return None
+        return self._tool_by_name.get(tool_name)
         
     def get_tools_by_category(self) -> Dict[str, List[str]]:
         """Get tools organized by category"""
-        categories = {
-            "Data Loading": [],
-            "Data Analysis": [],
-            "Visualization": [],
-            "File Management": [],
-            "Session Management": [],
-            "Other": []
-        }
+        if self._categories_cache is not None:
+            return self._categories_cache
+            
+        categories = {category: [] for category, _ in _CATEGORY_PATTERNS}
+        categories["Other"] = []
         
         for tool in self.tools:
             name = tool["function"]["name"]
             
-            if any(x in name for x in ["load", "read", "upload", "preview"]):
-                categories["Data Loading"].append(name)
-            elif any(x in name for x in ["pandas", "validate", "execution", "metadata"]):
-                categories["Data Analysis"].append(name)
-            elif any(x in name for x in ["chart", "visualization", "plot", "graph", "heatmap"]):
-                categories["Visualization"].append(name)
-            elif any(x in name for x in ["file", "temp", "format"]):
-                categories["File Management"].append(name)
-            elif any(x in name for x in ["session", "clear", "info"]):
-                categories["Session Management"].append(name)
+            for category, pattern in _CATEGORY_PATTERNS:
+                if pattern.search(name):
+                    categories[category].append(name)
+                    break
             else:
                 categories["Other"].append(name)
                 
-        return {k: v for k, v in categories.items() if v}
+        self._categories_cache = {k: v for k, v in categories.items() if v}
+        return self._categories_cache
         
     def is_connected(self) -> bool:
         """Check if connected to MCP server"""
@@ -184,9 +535,15 @@ class MCPClient:
             "connected": self.connected,
             "tools_count": len(self.tools),
             "connection_time": self.connection_time.isoformat() if self.connection_time else None,
-            "server_url": self.settings.mcp_sse_url
+            "server_url": self.url
         }
         
     def needs_file_injection(self, tool_name: str) -> bool:
         """Check if tool needs file content injection"""
-        return tool_name == "upload_temp_file_tool"
\ No newline at end of file
+        return tool_name == "upload_temp_file_tool"
+
+
+@st.cache_resource(show_spinner=False)
+def get_mcp_client(url: str) -> MCPClient:
+    """Get the shared MCP client for a server URL (used by the sidebar and the chat handler)"""
+    return MCPClient(url)
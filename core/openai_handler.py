@@ -1,14 +1,31 @@
 """OpenAI API handler for pandas-chat-app"""
 
-import json
 import time
-from typing import List, Dict, Any, Optional, Tuple
+from collections import deque
+from itertools import islice
+from typing import List, Dict, Any, Iterator, Optional, Tuple, Union
 from datetime import datetime
 import streamlit as st
 from openai import OpenAI
 from config import get_settings, get_prompt_manager
-from utils import get_logger, ChartHandler, run_async
-from .mcp_client import MCPClient
+from utils import get_logger, get_chart_handler, run_async, json_loads, json_dumps
+from .mcp_client import MCPClient, ToolResult, hash_tools, get_mcp_client
+from .session import file_text
+
+# Argument fields shown as a length placeholder when they're large
+TRUNC_KEYS = frozenset({"content", "html_content", "code"})
+
+# Last formatted wall-clock second, reused for every tool log entry within it
+_last_hms = (0, "")
+
+
+def _clock_hms() -> str:
+    """Current time as HH:MM:SS, formatted at most once per second"""
+    global _last_hms
+    now = int(time.time())
+    if now != _last_hms[0]:
+        _last_hms = (now, time.strftime("%H:%M:%S", time.localtime(now)))
+    return _last_hms[1]
 
 
 class OpenAIHandler:
@@ -18,10 +35,16 @@ class OpenAIHandler:
         self.settings = get_settings()
         self.logger = get_logger()
         self.prompt_manager = get_prompt_manager()
-        self.chart_handler = ChartHandler()
+        self.chart_handler = get_chart_handler()
         self.mcp_client = mcp_client
         self.client: Optional[OpenAI] = None
         
+        # Tool list sent to OpenAI, reused until the schemas change
+        self._tools_source: Optional[List[Dict[str, Any]]] = None
+        self._last_tools_hash: Optional[str] = None
+        self._tools_payload: List[Dict[str, Any]] = []
+        self._inline_html_tools: frozenset = frozenset()
+        
     def initialize(self, api_key: str):
         """Initialize OpenAI client with API key"""
         self.client = OpenAI(api_key=api_key)
@@ -31,20 +54,28 @@ class OpenAIHandler:
         self,
         messages: List[Dict[str, Any]],
         tools: List[Dict[str, Any]],
-        file_contents: Dict[str, str]
-    ) -> Tuple[str, List[int]]:
+        file_contents: Dict[str, memoryview],
+        stream: bool = False
+    ) -> Tuple[Union[str, Iterator[str]], List[int]]:
         """
         Process messages with OpenAI and handle tool calls.
         
+        With stream=True the response is an iterator of text chunks (for
+        st.write_stream), and the final summary is streamed as it is generated.
+        
         Returns:
             Tuple of (response_text, chart_indices)
         """
         if not self.client:
             return "Please enter your OpenAI API key.", []
             
+        tools = self._prepare_tools(tools)
         total_tool_calls = 0
         tool_logs = []
         chart_indices = []
+        recent_signatures = deque(maxlen=3)
+        # Decoded text of injected files, shared by every call that needs the same file
+        injected_text: Dict[str, str] = {}
         
         while total_tool_calls < self.settings.max_tool_calls:
             # Call OpenAI
@@ -77,9 +108,19 @@ class OpenAIHandler:
             
             # If no tool calls, return the response
             if not assistant_message.tool_calls:
-                st.session_state.tool_logs = tool_logs
-                return assistant_message.content, chart_indices
+                st.session_state.tool_logs = deque(tool_logs, maxlen=50)
+                content = assistant_message.content or ""
+                return (iter((content,)) if stream else content), chart_indices
                 
+            # Stop if the model repeats a recent round of identical tool calls
+            signature = hash(tuple(
+                (tc.function.name, tc.function.arguments) for tc in assistant_message.tool_calls
+            ))
+            if signature in recent_signatures:
+                self.logger.log("warning", "Repeated tool calls detected, stopping tool loop")
+                break
+            recent_signatures.append(signature)
+            
             # Add assistant message
             messages.append({
                 "role": "assistant",
@@ -96,34 +137,44 @@ class OpenAIHandler:
                 ]
             })
             
-            # Execute tool calls
+            # Collect this turn's tool calls
+            pending_calls = []
             for tool_call in assistant_message.tool_calls:
                 total_tool_calls += 1
                 if total_tool_calls > self.settings.max_tool_calls:
                     break
                     
                 tool_name = tool_call.function.name
-                tool_args = json.loads(tool_call.function.arguments)
+                tool_args = json_loads(tool_call.function.arguments)
                 
+                # Ask chart tools that support it to return their HTML inline
+                if tool_name in self._inline_html_tools:
+                    tool_args["return_html"] = True
+                    
                 # Handle file injection
                 if self.mcp_client.needs_file_injection(tool_name):
                     filename = tool_args.get("filename", "")
                     if filename in file_contents:
-                        tool_args["content"] = file_contents[filename]
+                        if filename not in injected_text:
+                            injected_text[filename] = file_text(file_contents[filename])
+                        tool_args["content"] = injected_text[filename]
                         st.info(f"📤 Injecting content for {filename}")
                         
-                # Execute tool with status display
-                result = self.execute_tool_with_status(
-                    tool_name,
-                    tool_args,
-                    tool_logs
-                )
+                pending_calls.append((tool_call, tool_name, tool_args))
                 
+            # Execute tool calls concurrently with status display
+            results = self.execute_tools_with_status(
+                [(tool_name, tool_args) for _, tool_name, tool_args in pending_calls],
+                tool_logs
+            )
+            
+            chart_results = []
+            for (tool_call, tool_name, _), result in zip(pending_calls, results):
                 # Check for chart creation
                 if tool_name in self.chart_handler.chart_tools:
-                    chart_info = self.handle_chart_creation(tool_name, result)
-                    if chart_info:
-                        chart_indices.append(chart_info['index'])
+                    message_result, html_content = self._split_inline_html(result)
+                    chart_results.append((tool_name, result, html_content))
+                    result = message_result
                         
                 # Add result to messages
                 if len(result) > 5000:
@@ -135,18 +186,72 @@ class OpenAIHandler:
                     "content": result
                 })
                 
+            # Store and show this round's charts, fetching any missing HTML together
+            chart_indices.extend(
+                chart['index'] for chart in self.handle_chart_results(chart_results)
+            )
+                
         # Final response
-        st.session_state.tool_logs = tool_logs
+        st.session_state.tool_logs = deque(tool_logs, maxlen=50)
         
         final_response = self.client.chat.completions.create(
             model=self.settings.openai_model,
-            messages=messages,
+            messages=self._compact_tool_messages(messages),
             temperature=self.settings.openai_temperature,
-            max_tokens=self.settings.openai_max_tokens
+            max_tokens=self.settings.openai_max_tokens,
+            stream=stream
         )
         
+        if stream:
+            return self._stream_text(final_response), chart_indices
         return final_response.choices[0].message.content, chart_indices
         
+    @staticmethod
+    def _stream_text(chunks) -> Iterator[str]:
+        """Yield the text deltas of a streamed completion"""
+        for chunk in chunks:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+        
+    def _compact_tool_messages(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Shrink tool outputs for the final summary call.
+        
+        Keeps the newest tool outputs up to final_summary_budget characters and
+        replaces older ones with a placeholder, so the tool-call pairing stays valid.
+        """
+        budget = self.settings.final_summary_budget
+        compacted = []
+        for msg in reversed(messages):
+            if msg["role"] == "tool":
+                size = len(msg["content"])
+                if size > budget:
+                    msg = {**msg, "content": "(tool output omitted)"}
+                else:
+                    budget -= size
+            compacted.append(msg)
+        compacted.reverse()
+        return compacted
+        
+    def _prepare_tools(self, tools: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Get the tool list for OpenAI, only rebuilding it when the schemas change"""
+        if tools is self._tools_source:
+            return self._tools_payload
+            
+        tools_hash = hash_tools(tools)
+        if tools_hash != self._last_tools_hash:
+            self._tools_payload = list(tools)
+            self._last_tools_hash = tools_hash
+            
+            # Chart tools that can return their HTML in the creation response
+            self._inline_html_tools = frozenset(
+                tool["function"]["name"] for tool in tools
+                if tool["function"]["name"] in self.chart_handler.chart_tools
+                and "return_html" in (tool["function"].get("parameters") or {}).get("properties", {})
+            )
+        self._tools_source = tools
+        return self._tools_payload
+        
     def execute_tool_with_status(
         self,
         tool_name: str,
@@ -154,40 +259,60 @@ class OpenAIHandler:
         tool_logs: List[Dict]
     ) -> str:
         """Execute tool and display status"""
+        return self.execute_tools_with_status([(tool_name, tool_args)], tool_logs)[0]
         
-        # Log entry
-        log_entry = {
-            "tool": tool_name,
-            "args": tool_args,
-            "timestamp": datetime.now().strftime("%H:%M:%S")
-        }
-        
-        with st.status(f"Calling {tool_name}...", expanded=True) as status:
-            # Show arguments
+    def execute_tools_with_status(
+        self,
+        tool_calls: List[Tuple[str, Dict[str, Any]]],
+        tool_logs: List[Dict]
+    ) -> List[str]:
+        """Execute tools concurrently and display their status in call order"""
+        if not tool_calls:
+            return []
+            
+        # Create every status container up front so UI writes stay on the script thread
+        pending = []
+        for tool_name, tool_args in tool_calls:
+            # Log the truncated display args so injected file content isn't kept
             display_args = self.format_args_for_display(tool_args)
-            status.write(f"**Arguments:** `{json.dumps(display_args, indent=2)}`")
+            log_entry = {
+                "tool": tool_name,
+                "args": display_args,
+                "timestamp": _clock_hms()
+            }
             
-            # Call tool
-            result = run_async(self.mcp_client.call_tool(tool_name, tool_args))
+            status = st.status(f"Calling {tool_name}...", expanded=True)
+            status.write(f"**Arguments:** `{json_dumps(display_args, indent=True)}`")
+            pending.append((tool_name, status, log_entry))
+            
+        # Call tools in one event loop run (batched when the server supports it)
+        self.mcp_client.bind_session_cache()
+        start_time = time.time()
+        results = run_async(self.mcp_client.call_tools_batch(tool_calls))
+        # Calls share one round-trip, so each is logged with the round's duration
+        duration_ms = round((time.time() - start_time) * 1000)
+        
+        for (tool_name, status, log_entry), result in zip(pending, results):
             log_entry["result"] = result[:500]
+            log_entry["success"] = not result.startswith("Error:")
+            log_entry["duration_ms"] = duration_ms
             
             # Parse and show result
             self.display_tool_result(result, status, tool_name, log_entry)
+            tool_logs.append(log_entry)
             
-        tool_logs.append(log_entry)
-        return result
+        return results
         
     def format_args_for_display(self, args: Dict[str, Any]) -> Dict[str, Any]:
         """Format arguments for display, truncating large content"""
-        display_args = args.copy()
-        
-        # Truncate large fields
-        for key in ["content", "html_content", "code"]:
-            if key in display_args and isinstance(display_args[key], str):
-                if len(display_args[key]) > 100:
-                    display_args[key] = f"<{len(args[key])} chars>"
-                    
-        return display_args
+        return {
+            key: (
+                f"<{len(value)} chars>"
+                if key in TRUNC_KEYS and isinstance(value, str) and len(value) > 100
+                else value
+            )
+            for key, value in args.items()
+        }
         
     def display_tool_result(
         self,
@@ -196,77 +321,126 @@ class OpenAIHandler:
         tool_name: str,
         log_entry: Dict
     ):
-        """Display tool execution result in status"""
+        """Display tool execution result in status with a single write"""
+        lines = []
         try:
-            result_data = json.loads(result)
+            result_data = json_loads(result)
             success = result_data.get("success", False)
             
             if success:
-                status.write(f"✅ **Success!**")
+                lines.append("✅ **Success!**")
                 
                 # Show relevant fields
                 if "filepath" in result_data:
-                    status.write(f"Filepath: `{result_data['filepath']}`")
+                    lines.append(f"Filepath: `{result_data['filepath']}`")
                 if "dataframe_info" in result_data:
                     info = result_data["dataframe_info"]
-                    status.write(f"Shape: {info.get('shape', '?')}")
+                    lines.append(f"Shape: {info.get('shape', '?')}")
                 if "chart_type" in result_data:
-                    status.write(f"Chart: {result_data['chart_type']}")
+                    lines.append(f"Chart: {result_data['chart_type']}")
                     
-                status.update(label=f"✅ {tool_name}", state="complete")
+                label, state = f"✅ {tool_name}", "complete"
             else:
                 error = result_data.get("error", "Unknown error")
-                status.write(f"❌ **Failed:** {error}")
-                status.update(label=f"❌ {tool_name}: {error[:50]}", state="error")
+                lines.append(f"❌ **Failed:** {error}")
+                label, state = f"❌ {tool_name}: {error[:50]}", "error"
                 log_entry["error"] = error
+                log_entry["success"] = False
         except:
             # Non-JSON result
+            lines = [f"Result: {result[:200]}..."]
             if "error" in result.lower():
-                status.update(label=f"⚠️ {tool_name}", state="error")
+                label, state = f"⚠️ {tool_name}", "error"
             else:
-                status.update(label=f"✅ {tool_name}", state="complete")
-            status.write(f"Result: {result[:200]}...")
+                label, state = f"✅ {tool_name}", "complete"
+                
+        status.markdown("\n\n".join(lines))
+        status.update(label=label, state=state)
             
-    def handle_chart_creation(self, tool_name: str, result: str) -> Optional[Dict[str, Any]]:
-        """Handle chart creation and fetch HTML"""
+    def handle_chart_creation(
+        self,
+        tool_name: str,
+        result: str,
+        html_content: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Handle chart creation, fetching the HTML unless it came back inline"""
+        charts = self.handle_chart_results([(tool_name, result, html_content)])
+        return charts[0] if charts else None
         
-        chart_info = self.chart_handler.detect_chart_in_response(tool_name, result)
+    def handle_chart_results(
+        self,
+        chart_results: List[Tuple[str, str, Optional[str]]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Store and display the charts from a round of (tool_name, result, html) results.
         
-        if not chart_info:
-            return None
+        Charts whose HTML didn't come back inline are fetched in one batch
+        instead of one get_chart_html_tool round-trip each.
+        """
+        charts = []
+        for tool_name, result, html_content in chart_results:
+            # Reuse the chart info MCPClient parsed from the result, if any
+            if isinstance(result, ToolResult):
+                chart_info = result.chart_info
+            else:
+                chart_info = self.chart_handler.detect_chart_in_response(tool_name, result)
+            if chart_info:
+                charts.append([chart_info, html_content])
+                
+        missing = [chart for chart in charts if chart[1] is None and chart[0].get('filepath')]
+        if missing:
+            try:
+                self.mcp_client.bind_session_cache()
+                html_results = run_async(self.mcp_client.call_tools_batch([
+                    ("get_chart_html_tool", {"filepath": chart_info['filepath']})
+                    for chart_info, _ in missing
+                ]))
+            except Exception as e:
+                self.logger.log("error", f"Failed to fetch chart HTML: {str(e)}")
+                html_results = ()
+            for chart, html_result in zip(missing, html_results):
+                try:
+                    html_data = json_loads(html_result)
+                    if html_data.get('success'):
+                        chart[1] = html_data['html_content']
+                except Exception as e:
+                    self.logger.log("error", f"Failed to fetch chart HTML: {str(e)}")
+                    
+        created = []
+        for chart_info, html_content in charts:
+            if html_content is None:
+                st.warning(f"Chart created but could not display: {chart_info.get('filename', 'chart')}")
+                continue
+                
+            # Store chart
+            index = self.chart_handler.store_chart(chart_info, html_content)
             
-        # Automatically fetch HTML content
-        try:
-            html_result = run_async(
-                self.mcp_client.call_tool(
-                    "get_chart_html_tool",
-                    {"filepath": chart_info['filepath']}
-                )
+            # Display inline
+            self.chart_handler.display_chart(
+                html_content,
+                title=chart_info.get('chart_type', 'Chart')
             )
             
-            html_data = json.loads(html_result)
+            created.append({'index': index, 'info': chart_info})
             
-            if html_data.get('success'):
-                # Store chart
-                index = self.chart_handler.store_chart(
-                    chart_info,
-                    html_data['html_content']
-                )
-                
-                # Display inline
-                self.chart_handler.display_chart(
-                    html_data['html_content'],
-                    title=chart_info.get('chart_type', 'Chart')
-                )
-                
-                return {'index': index, 'info': chart_info}
-        except Exception as e:
-            self.logger.log("error", f"Failed to fetch chart HTML: {str(e)}")
-            st.warning(f"Chart created but could not display: {chart_info['filename']}")
+        return created
+        
+    def _split_inline_html(self, result: str) -> Tuple[str, Optional[str]]:
+        """Pull inline chart HTML out of a tool result so it isn't sent to the model"""
+        if '"html_content"' not in result:
+            return result, None
             
-        return None
+        try:
+            result_data = json_loads(result)
+        except ValueError:
+            return result, None
+            
+        html_content = result_data.pop("html_content", None) if isinstance(result_data, dict) else None
+        if not isinstance(html_content, str):
+            return result, None
+        return json_dumps(result_data), html_content
         
-    def prepare_system_prompt(self, file_contents: Dict[str, str]) -> str:
+    def prepare_system_prompt(self, file_contents: Dict[str, memoryview]) -> str:
         """Prepare system prompt with context"""
         
         files_info = ", ".join(file_contents.keys()) if file_contents else ""
@@ -284,7 +458,7 @@ class OpenAIHandler:
     def prepare_messages(
         self,
         user_prompt: str,
-        file_contents: Dict[str, str]
+        file_contents: Dict[str, memoryview]
     ) -> List[Dict[str, str]]:
         """Prepare messages for API call"""
         
@@ -293,13 +467,42 @@ class OpenAIHandler:
         messages = [{"role": "system", "content": system_prompt}]
         
         # Add conversation history
-        if st.session_state.get('messages'):
-            recent_messages = st.session_state.messages[-self.settings.context_window:]
-            for msg in recent_messages:
-                if msg["role"] in ["user", "assistant"]:
-                    messages.append({
-                        "role": msg["role"],
-                        "content": msg["content"]
-                    })
+        messages.extend(self._history_window())
+        
+        return messages
+        
+    def _history_window(self) -> deque:
+        """Keep a rolling window of prepared history, pushing only new messages"""
+        window = self.settings.context_window
+        source = st.session_state.get('messages') or []
+        history = st.session_state.get('history_window')
+        last = st.session_state.get('history_last')
+        
+        # Find where the messages added since the last call start
+        start = None
+        if history is not None and history.maxlen == window and last is not None:
+            for i in range(len(source) - 1, max(len(source) - window - 1, -1), -1):
+                if source[i] is last:
+                    start = i + 1
+                    break
                     
-        return messages
\ No newline at end of file
+        if start is None:
+            history = deque(maxlen=window)
+            start = max(len(source) - window, 0)
+            
+        for msg in islice(source, start, None):
+            if msg["role"] in ("user", "assistant"):
+                history.append({
+                    "role": msg["role"],
+                    "content": msg["content"]
+                })
+                
+        st.session_state.history_window = history
+        st.session_state.history_last = source[-1] if source else None
+        return history
+
+
+@st.cache_resource
+def get_openai_handler(mcp_url: str) -> OpenAIHandler:
+    """Get the OpenAI handler for an MCP server, sharing the sidebar's connected client"""
+    return OpenAIHandler(get_mcp_client(mcp_url))
@@ -1,103 +1,223 @@
 """Session management for pandas-chat-app"""
 
 import streamlit as st
-from typing import Dict, Any, List, Optional
+from collections import deque
+from itertools import islice
+from typing import Dict, Any, List, Optional, Union
 from datetime import datetime
+import hashlib
+import mmap
+import sys
+import tempfile
+import time
 import uuid
 
-# Safe imports for Streamlit Cloud
-try:
-    from config import get_settings
-    from utils import get_logger, ChartHandler
-except ImportError:
-    import sys
-    from pathlib import Path
-    sys.path.insert(0, str(Path(__file__).parent.parent))
-    from config import get_settings
-    from utils import get_logger, ChartHandler
+from config import get_settings
+from utils import get_logger, get_chart_handler
+
+
+# Interned message roles so role comparisons are identity checks
+_ROLES = {role: sys.intern(role) for role in ("user", "assistant", "system", "tool")}
+_ROLE_TITLES = {role: role.title() for role in _ROLES}
+
+
+def _sized(content: Any) -> int:
+    return len(content) if isinstance(content, (str, bytes, memoryview)) else 0
+
+
+def file_text(content: Union[str, bytes, memoryview]) -> str:
+    """Decode stored file content to text on demand"""
+    if isinstance(content, str):
+        return content
+    return str(content, "utf-8", "ignore")
+
+
+def as_file_content(content: Union[str, bytes, memoryview]) -> memoryview:
+    """Store file content as a read-only view over UTF-8 bytes
+    
+    Uploads larger than settings.file_spill_bytes are written to an unlinked
+    temp file and mapped back in, so the OS can page them out while idle.
+    Content that is already a read-only view is returned as is.
+    """
+    if isinstance(content, memoryview) and content.readonly:
+        return content
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    settings = get_settings()
+    if 0 < settings.file_spill_bytes <= len(content):
+        return _spill_to_disk(content, settings.temp_dir / "uploads")
+    return memoryview(content).toreadonly()
+
+
+def _spill_to_disk(content: bytes, directory) -> memoryview:
+    """Map content from an anonymous temp file; the file goes away with the view"""
+    with tempfile.TemporaryFile(dir=directory) as f:
+        f.write(content)
+        f.flush()
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return memoryview(mapped)
+
+
+def _content_size(message: Dict[str, Any]) -> int:
+    return _sized(message.get("content"))
+
+
+def _chart_size(chart: Dict[str, Any]) -> int:
+    return _sized(chart.get("html"))
+
+
+def _with_iso_timestamp(message: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy of a message with its time_ns timestamp rendered as ISO 8601"""
+    timestamp = message.get("timestamp")
+    if not isinstance(timestamp, int):
+        return message
+    return {**message, "timestamp": datetime.fromtimestamp(timestamp / 1e9).isoformat()}
+
+
+# Buckets other components mutate directly, sized on demand (one len() per item).
+# File content is counted by add_file/remove_file instead; see total_file_size.
+_MEMORY_SIZERS = {
+    "generated_charts": lambda charts: sum(map(_chart_size, charts)),
+    "messages": lambda messages: sum(map(_content_size, messages)),
+}
 
 
 class SessionManager:
     """Manage Streamlit session state and data persistence"""
     
+    __slots__ = ("settings", "logger", "chart_handler")
+    
+    # (second, ISO string) of the last formatted timestamp, shared by all instances
+    _ts_cache = (0, "")
+    
+    # Keys produced by _defaults(), checked before building any default values
+    _DEFAULT_KEYS = frozenset((
+        "messages", "uploaded_files", "files_content", "mcp_tools", "mcp_connected_at",
+        "generated_charts", "openai_api_key", "use_custom_prompt", "current_chart_index",
+        "chart_display_settings",
+    ))
+    
     def __init__(self):
         self.settings = get_settings()
         self.logger = get_logger()
-        self.chart_handler = ChartHandler()
+        self.chart_handler = get_chart_handler()
         self._initialize_session()
     
     def _initialize_session(self):
         """Initialize session state with default values"""
-        if "session_id" not in st.session_state:
+        # Snapshot existing keys once instead of probing the state proxy per key
+        existing = set(st.session_state.keys())
+        
+        if "session_id" not in existing:
             st.session_state["session_id"] = str(uuid.uuid4())
         
-        defaults = {
-            "messages": [],
+        # Pages construct a SessionManager on every rerun; once the session is
+        # populated there is nothing to build
+        missing = self._DEFAULT_KEYS - existing
+        if missing:
+            defaults = self._defaults()
+            for key in missing:
+                st.session_state[key] = defaults[key]
+    
+    def _defaults(self) -> Dict[str, Any]:
+        """Fresh default session values"""
+        return {
+            "messages": deque(maxlen=self._history_limit()),
             "uploaded_files": {},
             "files_content": {},
             "mcp_tools": None,
             "mcp_connected_at": None,
-            "tool_logs": [],
-            "generated_charts": [],
+            "generated_charts": deque(maxlen=self.settings.max_charts_stored),
             "openai_api_key": "",
             "use_custom_prompt": False,
             "current_chart_index": None,
-            "chart_display_settings": {"height": 500, "show_inline": True, "expand_by_default": True},
-            "async_cache": {},
-            "async_timings": []
+            "chart_display_settings": {"height": 500, "show_inline": True, "expand_by_default": True}
         }
-        
-        for key, value in defaults.items():
-            if key not in st.session_state:
-                st.session_state[key] = value
+    
+    def _now_iso(self) -> str:
+        """Current time as ISO 8601, formatted at most once per second"""
+        now = int(time.time())
+        if now != SessionManager._ts_cache[0]:
+            SessionManager._ts_cache = (now, datetime.fromtimestamp(now).isoformat())
+        return SessionManager._ts_cache[1]
     
     def get(self, key: str, default: Any = None) -> Any:
         return st.session_state.get(key, default)
     
     def set(self, key: str, value: Any):
         st.session_state[key] = value
+        if key == "files_content":
+            # Replaced wholesale - total_file_size recounts on next read
+            st.session_state.pop("_file_bytes", None)
     
     def update(self, updates: Dict[str, Any]):
         for key, value in updates.items():
-            st.session_state[key] = value
+            self.set(key, value)
     
-    def add_message(self, role: str, content: str, metadata: Optional[Dict[str, Any]] = None):
-        """Add a message to the conversation"""
-        if "messages" not in st.session_state:
-            st.session_state["messages"] = []
-        
-        message = {"role": role, "content": content, "timestamp": datetime.now().isoformat()}
-        if metadata:
-            message.update(metadata)
-        
-        st.session_state["messages"].append(message)
-        
+    def set_api_key(self, api_key: str):
+        """Store the session's API key and its fingerprint, hashing only when the key changes"""
+        ss = st.session_state
+        if ss.get("openai_api_key") == api_key and "_api_key_fp" in ss:
+            return
+        ss["openai_api_key"] = api_key
+        ss["_api_key_fp"] = hashlib.sha256(api_key.encode()).hexdigest()[:8] if api_key else ""
+    
+    def clear_api_key(self):
+        st.session_state.pop("openai_api_key", None)
+        st.session_state.pop("_api_key_fp", None)
+    
+    def get_api_key_fingerprint(self) -> Optional[str]:
+        """Short hash identifying the session's API key, for logs and exports"""
+        if not st.session_state.get("openai_api_key"):
+            return None
+        return st.session_state.get("_api_key_fp") or None
+    
+    def _history_limit(self) -> int:
         limit = 50
         if self.settings:
             try:
                 limit = self.settings.message_history_limit
             except:
                 pass
+        return limit
+    
+    def _message_log(self) -> deque:
+        """Get the message deque, (re)creating it if missing or sized for another limit"""
+        limit = self._history_limit()
+        messages = st.session_state.get("messages")
+        if not isinstance(messages, deque) or messages.maxlen != limit:
+            messages = deque(messages or (), maxlen=limit)
+            st.session_state["messages"] = messages
+        return messages
+    
+    def add_message(self, role: str, content: str, metadata: Optional[Dict[str, Any]] = None):
+        """Add a message to the conversation"""
+        messages = self._message_log()
         
-        if len(st.session_state["messages"]) > limit:
-            st.session_state["messages"] = st.session_state["messages"][-limit:]
+        role = _ROLES.get(role) or sys.intern(role)
+        message = {"role": role, "content": content, "timestamp": time.time_ns()}
+        if metadata:
+            message.update(metadata)
+        
+        messages.append(message)
         
         if self.logger:
-            self.logger.log("info", f"{role.title()} message added")
+            self.logger.log("info", f"{_ROLE_TITLES.get(role) or role.title()} message added")
     
-    def add_file(self, filename: str, content: str, metadata: Optional[Dict[str, Any]] = None):
-        """Add an uploaded file to session"""
-        if "uploaded_files" not in st.session_state:
-            st.session_state["uploaded_files"] = {}
-        if "files_content" not in st.session_state:
-            st.session_state["files_content"] = {}
+    def add_file(self, filename: str, content: Union[str, bytes], metadata: Optional[Dict[str, Any]] = None):
+        """Add an uploaded file to session (kept as bytes, decoded on demand)"""
+        content = as_file_content(content)
+        uploaded_files = st.session_state.setdefault("uploaded_files", {})
+        files_content = st.session_state.setdefault("files_content", {})
         
-        file_info = {"size": len(content) if content else 0, "upload_time": datetime.now().isoformat()}
+        file_info = {"size": len(content) if content else 0, "upload_time": self._now_iso()}
         if metadata:
             file_info.update(metadata)
         
-        st.session_state["uploaded_files"][filename] = file_info
-        st.session_state["files_content"][filename] = content
+        total = self.total_file_size - _sized(files_content.get(filename))
+        uploaded_files[filename] = file_info
+        files_content[filename] = content
+        st.session_state["_file_bytes"] = total + _sized(content)
         
         if self.logger:
             self.logger.log_file_operation("upload", filename, len(content), success=True)
@@ -107,24 +227,38 @@ class SessionManager:
         if "uploaded_files" in st.session_state and filename in st.session_state["uploaded_files"]:
             del st.session_state["uploaded_files"][filename]
         if "files_content" in st.session_state and filename in st.session_state["files_content"]:
-            del st.session_state["files_content"][filename]
+            total = self.total_file_size
+            st.session_state["_file_bytes"] = total - _sized(st.session_state["files_content"].pop(filename))
         
         if self.logger:
             self.logger.log_file_operation("remove", filename, success=True)
     
-    def get_files(self) -> Dict[str, str]:
+    @property
+    def total_file_size(self) -> int:
+        """Bytes of uploaded file content, counted by add_file/remove_file/clear_files"""
+        ss = st.session_state
+        if "_file_bytes" not in ss:
+            ss["_file_bytes"] = sum(map(_sized, ss.get("files_content", {}).values()))
+        return ss["_file_bytes"]
+    
+    def get_files(self) -> Dict[str, memoryview]:
         return st.session_state.get("files_content", {})
     
+    def get_file_text(self, filename: str) -> Optional[str]:
+        """Get a file's content decoded as text"""
+        content = st.session_state.get("files_content", {}).get(filename)
+        return None if content is None else file_text(content)
+    
     def get_messages(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
         """Get conversation messages"""
-        messages = st.session_state.get("messages", [])
+        messages = st.session_state.get("messages", ())
         if limit and limit > 0:
-            return messages[-limit:]
-        return messages
+            return list(islice(messages, max(len(messages) - limit, 0), None))
+        return list(messages)
     
     def set_tools(self, tools: List[Dict[str, Any]]):
         st.session_state["mcp_tools"] = tools
-        st.session_state["mcp_connected_at"] = datetime.now().isoformat()
+        st.session_state["mcp_connected_at"] = self._now_iso()
     
     def get_tools(self) -> Optional[List[Dict[str, Any]]]:
         return st.session_state.get("mcp_tools")
@@ -133,7 +267,7 @@ class SessionManager:
         return bool(st.session_state.get("mcp_tools"))
     
     def clear_messages(self):
-        st.session_state["messages"] = []
+        self._message_log().clear()
         if self.logger:
             self.logger.log("info", "Messages cleared")
     
@@ -141,76 +275,82 @@ class SessionManager:
         count = len(st.session_state.get("uploaded_files", {}))
         st.session_state["uploaded_files"] = {}
         st.session_state["files_content"] = {}
+        st.session_state["_file_bytes"] = 0
         if self.logger:
             self.logger.log("info", f"Cleared {count} files")
     
     def clear_charts(self):
-        count = len(st.session_state.get("generated_charts", []))
-        st.session_state["generated_charts"] = []
+        count = len(st.session_state.get("generated_charts", ()))
+        self.chart_handler.clear_charts()
         st.session_state["current_chart_index"] = None
         if self.logger:
             self.logger.log("info", f"Cleared {count} charts")
     
     def clear_all(self, keep_connection: bool = True):
-        preserved = {}
+        preserved_keys = ["session_id"]
         if keep_connection:
-            if "mcp_tools" in st.session_state:
-                preserved["mcp_tools"] = st.session_state["mcp_tools"]
-            if "mcp_connected_at" in st.session_state:
-                preserved["mcp_connected_at"] = st.session_state["mcp_connected_at"]
-        
-        for key in list(st.session_state.keys()):
-            del st.session_state[key]
+            preserved_keys += ["mcp_tools", "mcp_connected_at"]
+        preserved = {k: st.session_state[k] for k in preserved_keys if k in st.session_state}
         
-        for key, value in preserved.items():
-            st.session_state[key] = value
+        # Build the whole new state up front and swap it in with two bulk operations
+        new_state = {**self._defaults(), **preserved}
+        new_state.setdefault("session_id", str(uuid.uuid4()))
         
-        self._initialize_session()
+        st.session_state.clear()
+        st.session_state.update(new_state)
         
         if self.logger:
             self.logger.log("info", f"Session cleared")
     
-    def export_session(self) -> Dict[str, Any]:
-        session_id = st.session_state.get("session_id", "unknown")
+    def export_session(self, message_limit: int = 200) -> Dict[str, Any]:
+        """Export a session summary with the last message_limit messages"""
+        ss = st.session_state
+        messages = ss.get("messages", ())
+        session_id = ss.get("session_id", "unknown")
         session_id_short = str(session_id)[:8] if session_id and session_id != "unknown" else "unknown"
+        tools = ss.get("mcp_tools") or ()
         
         return {
             "session_id": session_id_short,
-            "messages": st.session_state.get("messages", []),
-            "uploaded_files": list(st.session_state.get("uploaded_files", {}).keys()),
-            "charts_count": len(st.session_state.get("generated_charts", [])),
-            "tools_count": len(st.session_state.get("mcp_tools", [])) if st.session_state.get("mcp_tools") else 0,
-            "connected": self.is_connected(),
-            "timestamp": datetime.now().isoformat()
+            "messages": [
+                _with_iso_timestamp(m)
+                for m in islice(messages, max(len(messages) - message_limit, 0), None)
+            ],
+            "uploaded_files": list(ss.get("uploaded_files", {}).keys()),
+            "charts_count": len(ss.get("generated_charts", ())),
+            "tools_count": len(tools),
+            "connected": bool(tools),
+            "api_key_fingerprint": self.get_api_key_fingerprint(),
+            "timestamp": self._now_iso()
         }
     
-    def get_stats(self) -> Dict[str, Any]:
-        return {
-            "messages": len(st.session_state.get("messages", [])),
-            "files": len(st.session_state.get("uploaded_files", {})),
-            "charts": len(st.session_state.get("generated_charts", [])),
-            "tools": len(st.session_state.get("mcp_tools", [])) if st.session_state.get("mcp_tools") else 0,
-            "tool_calls": len(st.session_state.get("tool_logs", [])),
-            "cache_size": len(st.session_state.get("async_cache", {})),
-            "memory_kb": self._estimate_memory_usage() / 1024
+    def get_stats(self, include_memory: bool = False) -> Dict[str, Any]:
+        """Session counters; memory_kb is only estimated when include_memory is set"""
+        ss = st.session_state
+        stats = {
+            "messages": len(ss.get("messages", ())),
+            "files": len(ss.get("uploaded_files", ())),
+            "charts": len(ss.get("generated_charts", ())),
+            "tools": len(ss.get("mcp_tools") or ()),
+            "tool_calls": len(ss.get("tool_logs", ())),
+            "cache_size": len(ss.get("async_cache", ())),
+            "cache_hit_rate": self._cache_hit_rate()
         }
+        if include_memory:
+            stats["memory_kb"] = self._estimate_memory_usage() / 1024
+        return stats
+    
+    def _cache_hit_rate(self) -> float:
+        stats = st.session_state.get("tool_cache_stats") or {}
+        lookups = stats.get("hits", 0) + stats.get("misses", 0)
+        return stats.get("hits", 0) / lookups if lookups else 0.0
     
     def _estimate_memory_usage(self) -> int:
-        total = 0
-        try:
-            for content in st.session_state.get("files_content", {}).values():
-                if isinstance(content, (str, bytes)):
-                    total += len(content)
-            for chart in st.session_state.get("generated_charts", []):
-                if "html" in chart and isinstance(chart["html"], str):
-                    total += len(chart["html"])
-            for message in st.session_state.get("messages", []):
-                content = message.get("content", "")
-                if isinstance(content, str):
-                    total += len(content)
-        except:
-            pass
-        return total
+        """Total content bytes held in session"""
+        ss = st.session_state
+        return self.total_file_size + sum(
+            sizer(ss.get(bucket) or ()) for bucket, sizer in _MEMORY_SIZERS.items()
+        )
     
     def validate_state(self) -> tuple[bool, List[str]]:
         errors = []
@@ -222,12 +362,27 @@ class SessionManager:
         files = st.session_state.get("uploaded_files", {})
         contents = st.session_state.get("files_content", {})
         
-        for filename in files:
-            if filename not in contents:
-                errors.append(f"File content missing for {filename}")
-        
-        for filename in contents:
-            if filename not in files:
-                errors.append(f"File info missing for {filename}")
+        # Set differences over the key views run in C
+        if files.keys() ^ contents.keys():
+            errors.extend(
+                f"File content missing for {filename}"
+                for filename in sorted(files.keys() - contents.keys())
+            )
+            errors.extend(
+                f"File info missing for {filename}"
+                for filename in sorted(contents.keys() - files.keys())
+            )
         
         return len(errors) == 0, errors
+
+
+@st.cache_resource
+def _shared_session_manager() -> SessionManager:
+    return SessionManager()
+
+
+def get_session_manager() -> SessionManager:
+    """Get the shared session manager, making sure this session's state exists"""
+    manager = _shared_session_manager()
+    manager._initialize_session()
+    return manager
@@ -10,13 +10,13 @@ from pathlib import Path
 from config import get_settings, get_prompt_manager
 
 # Import core modules
-from core import MCPClient, OpenAIHandler, SessionManager
+from core import get_openai_handler, get_session_manager
 
 # Import components
-from components import render_sidebar, render_chat_interface
+from components import render_sidebar, render_chat_interface, inject_sidebar_css
 
 # Import utilities
-from utils import get_logger, ChartHandler, run_async
+from utils import get_logger, get_chart_handler, run_async
 
 # Initialize settings and logger
 settings = get_settings()
@@ -31,51 +31,13 @@ st.set_page_config(
 )
 
 # Add custom CSS to make sidebar page names bigger
-st.markdown("""
-<style>
-    /* Make sidebar page links bigger */
-    .css-w770g5 {
-        font-size: 18px !important;
-        font-weight: 500 !important;
-    }
-    
-    /* Make the page names in sidebar bigger */
-    [data-testid="stSidebarNav"] li div a {
-        font-size: 18px !important;
-        font-weight: 500 !important;
-        padding: 0.75rem 1rem !important;
-    }
-    
-    /* Make the current page highlighted better */
-    [data-testid="stSidebarNav"] li div a[aria-selected="true"] {
-        background-color: rgba(255, 255, 255, 0.1);
-        font-weight: 600 !important;
-    }
-    
-    /* Increase spacing between pages */
-    [data-testid="stSidebarNav"] li {
-        margin-bottom: 0.5rem;
-    }
-    
-    /* Style the main navigation header */
-    [data-testid="stSidebarNav"] {
-        padding-top: 1rem;
-        padding-bottom: 1rem;
-    }
-</style>
-""", unsafe_allow_html=True)
-
-# Initialize core modules
-@st.cache_resource
-def init_core_modules():
-    """Initialize core modules (cached across reruns)"""
-    mcp_client = MCPClient()
-    openai_handler = OpenAIHandler(mcp_client)
-    return mcp_client, openai_handler
-
-mcp_client, openai_handler = init_core_modules()
-session_manager = SessionManager()
-chart_handler = ChartHandler()
+inject_sidebar_css()
+
+# Initialize core modules (shared across reruns and pages)
+openai_handler = get_openai_handler(st.session_state.get('mcp_url') or settings.mcp_sse_url)
+mcp_client = openai_handler.mcp_client
+session_manager = get_session_manager()
+chart_handler = get_chart_handler()
 
 # Main app
 def main():
@@ -171,31 +133,37 @@ def process_assistant_response(user_prompt: str):
         st.error("No MCP tools available")
         return
     
+    placeholder = None
+    
     try:
         # Process with OpenAI
-        response, chart_indices = openai_handler.process_message(
+        response_stream, chart_indices = openai_handler.process_message(
             messages,
             tools,
-            file_contents
+            file_contents,
+            stream=True
         )
         
-        # Display response
-        st.write(response)
+        # One placeholder holds the reply, so a failure mid-stream replaces partial output
+        placeholder = st.empty()
+        with placeholder.container():
+            # Display the response as it arrives
+            response = st.write_stream(response_stream)
+            
+            # Show link to charts if any were created
+            if chart_indices:
+                st.success(f"📊 {len(chart_indices)} chart(s) created! View them in the [Charts page](./2_📊_Charts)")
         
-        # Add to session
+        # Add to session once the turn is displayed
         session_manager.add_message(
             "assistant",
             response,
             {"chart_indices": chart_indices} if chart_indices else None
         )
         
-        # Show link to charts if any were created
-        if chart_indices:
-            st.success(f"📊 {len(chart_indices)} chart(s) created! View them in the [Charts page](./2_📊_Charts)")
-        
     except Exception as e:
         error_msg = f"Error processing request: {str(e)}"
-        st.error(error_msg)
+        (placeholder if placeholder is not None else st).error(error_msg)
         logger.log("error", error_msg)
         
         # Add error to session
@@ -3,19 +3,14 @@ File Management Page
 """
 
 import streamlit as st
-import sys
-from pathlib import Path
-
-# Add parent directory to path for imports
-sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from config import get_settings
 from components import render_file_manager, render_sidebar
-from core import SessionManager
+from core import get_session_manager
 
 # Initialize
 settings = get_settings()
-session_manager = SessionManager()
+session_manager = get_session_manager()
 
 # Page config
 st.set_page_config(
@@ -24,6 +19,18 @@ st.set_page_config(
     layout=settings.app_layout
 )
 
+_WORKFLOW_MD = """
+### Upload and manage your data files
+
+Upload CSV, Excel, JSON, or Parquet files to analyze with natural language queries.
+
+**Workflow:**
+1. Upload files here
+2. Go to Chat page to analyze
+3. View generated charts in Charts page
+"""
+
+
 def main():
     st.title("📁 File Management")
     
@@ -34,16 +41,7 @@ def main():
     col1, col2 = st.columns([2, 1])
     
     with col1:
-        st.markdown("""
-        ### Upload and manage your data files
-        
-        Upload CSV, Excel, JSON, or Parquet files to analyze with natural language queries.
-        
-        **Workflow:**
-        1. Upload files here
-        2. Go to Chat page to analyze
-        3. View generated charts in Charts page
-        """)
+        st.markdown(_WORKFLOW_MD)
         
         # File manager
         render_file_manager()
@@ -55,7 +53,7 @@ def main():
         if files:
             st.metric("Total Files", len(files))
             
-            total_size = sum(f.get('size', 0) for f in files.values())
+            total_size = session_manager.total_file_size
             st.metric("Total Size", f"{total_size / (1024*1024):.2f} MB")
             
             st.divider()
@@ -63,12 +61,12 @@ def main():
             # Quick actions
             st.subheader("Quick Actions")
             
-            # Use navigation buttons instead of switch_page
+            # switch_page keeps the current session instead of reloading the browser
             if st.button("💬 Go to Chat", type="primary", use_container_width=True):
-                st.markdown('<meta http-equiv="refresh" content="0; url=/">', unsafe_allow_html=True)
+                st.switch_page("app.py")
                 
             if st.button("📈 View Charts", use_container_width=True):
-                st.markdown('<meta http-equiv="refresh" content="0; url=/2_📊_Charts">', unsafe_allow_html=True)
+                st.switch_page("pages/2_📊_Charts.py")
                 
             if st.button("🗑️ Clear All Files", use_container_width=True):
                 session_manager.clear_files()
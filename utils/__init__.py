@@ -1,11 +1,13 @@
 """Utils package for pandas-chat-app"""
 
 from .logger import AppLogger, get_logger
-from .chart_handler import ChartHandler
+from .chart_handler import ChartHandler, get_chart_handler
+from .json_helpers import json_loads, json_dumps
 from .async_helpers import (
     run_async,
     run_async_with_timeout,
     run_async_with_status,
+    submit_async,
     async_to_sync,
     AsyncBatch,
     AsyncRetry,
@@ -17,9 +19,13 @@ __all__ = [
     'AppLogger', 
     'get_logger', 
     'ChartHandler',
+    'get_chart_handler',
+    'json_loads',
+    'json_dumps',
     'run_async',
     'run_async_with_timeout',
     'run_async_with_status',
+    'submit_async',
     'async_to_sync',
     'AsyncBatch',
     'AsyncRetry',
@@ -3,7 +3,9 @@
 import asyncio
 import functools
 from typing import Any, Callable, Optional, TypeVar, Coroutine
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+import threading
 import time
 import streamlit as st
 from contextlib import asynccontextmanager
@@ -28,7 +30,7 @@ class AsyncRunner:
         try:
             return loop.run_until_complete(coro)
         finally:
-            loop.close()
+            self._close_loop(loop)
             
     def run_with_timeout(self, coro: Coroutine[Any, Any, T], timeout: float) -> T:
         """Run async coroutine with timeout"""
@@ -40,6 +42,18 @@ class AsyncRunner:
             )
         except asyncio.TimeoutError:
             raise TimeoutError(f"Operation timed out after {timeout} seconds")
+        finally:
+            self._close_loop(loop)
+            
+    def _close_loop(self, loop: asyncio.AbstractEventLoop):
+        """Cancel leftover tasks (e.g. persistent sessions) before closing the loop"""
+        try:
+            pending = asyncio.all_tasks(loop)
+            for task in pending:
+                task.cancel()
+            if pending:
+                loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            loop.run_until_complete(loop.shutdown_asyncgens())
         finally:
             loop.close()
             
@@ -52,17 +66,67 @@ class AsyncRunner:
 _async_runner = AsyncRunner()
 
 
+class BackgroundLoop:
+    """Long-lived event loop running in a daemon thread"""
+    
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self.loop.run_forever,
+            name="async-background-loop",
+            daemon=True
+        )
+        self._thread.start()
+        
+    def submit(self, coro: Coroutine[Any, Any, T]) -> Future:
+        """
+        Schedule a coroutine on the loop and return a thread-safe future.
+        The task starts in a copy of the caller's contextvars context.
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+        
+    def in_loop_thread(self) -> bool:
+        """Check if the caller is running on the loop's own thread"""
+        return threading.current_thread() is self._thread
+
+
+@st.cache_resource
+def get_background_loop() -> BackgroundLoop:
+    """Get the shared background event loop (created once per process)"""
+    return BackgroundLoop()
+
+
 def run_async(coro: Coroutine[Any, Any, T]) -> T:
     """
     Helper function to run async code in Streamlit.
     
+    Runs on the shared background loop, so loop-bound resources such as the
+    persistent MCP session are reused across calls and reruns.
+    
     Args:
         coro: Async coroutine to run
         
     Returns:
         Result of the coroutine
     """
-    return _async_runner.run(coro)
+    background = get_background_loop()
+    if background.in_loop_thread():
+        # Blocking on our own loop would deadlock - use a throwaway loop
+        return _async_runner.run(coro)
+    return background.submit(coro).result()
+
+
+def submit_async(coro: Coroutine[Any, Any, T]) -> Future:
+    """
+    Start async code without blocking the Streamlit script thread.
+    
+    Args:
+        coro: Async coroutine to run
+        
+    Returns:
+        Future that can be polled with done() on later reruns
+    """
+    return get_background_loop().submit(coro)
 
 
 def run_async_with_timeout(coro: Coroutine[Any, Any, T], timeout: float = 30.0) -> T:
@@ -79,7 +143,16 @@ def run_async_with_timeout(coro: Coroutine[Any, Any, T], timeout: float = 30.0)
     Raises:
         TimeoutError: If operation times out
     """
-    return _async_runner.run_with_timeout(coro, timeout)
+    background = get_background_loop()
+    if background.in_loop_thread():
+        return _async_runner.run_with_timeout(coro, timeout)
+        
+    future = background.submit(coro)
+    try:
+        return future.result(timeout=timeout)
+    except FuturesTimeoutError:
+        future.cancel()
+        raise TimeoutError(f"Operation timed out after {timeout} seconds")
 
 
 def async_to_sync(func: Callable[..., Coroutine[Any, Any, T]]) -> Callable[..., T]:
@@ -135,9 +208,7 @@ async def async_timer(name: str = "Operation"):
         yield
     finally:
         elapsed = (time.time() - start_time) * 1000
-        if 'async_timings' not in st.session_state:
-            st.session_state.async_timings = []
-        st.session_state.async_timings.append({
+        st.session_state.setdefault('async_timings', []).append({
             'name': name,
             'duration_ms': elapsed,
             'timestamp': time.time()
@@ -224,10 +295,7 @@ def create_async_cached_function(
             cache_key = f"{key_prefix}_{func.__name__}_{str(args)}_{str(kwargs)}"
             
             # Check cache
-            if 'async_cache' not in st.session_state:
-                st.session_state.async_cache = {}
-                
-            cache = st.session_state.async_cache
+            cache = st.session_state.setdefault('async_cache', {})
             
             # Check if cached and not expired
             if cache_key in cache:
@@ -307,5 +375,7 @@ def clear_async_cache():
     """Clear all async cached results"""
     if 'async_cache' in st.session_state:
         st.session_state.async_cache = {}
+    if 'tool_cache_stats' in st.session_state:
+        del st.session_state['tool_cache_stats']
     if 'async_timings' in st.session_state:
         st.session_state.async_timings = []
\ No newline at end of file
@@ -1,13 +1,15 @@
 """Chart detection and handling utilities for pandas-chat-app"""
 
 import json
+from collections import deque
 import streamlit as st
 import streamlit.components.v1 as components
 from pathlib import Path
 from typing import Dict, Optional, Any, List
 from datetime import datetime
-import base64
-import time
+import uuid
+from .json_helpers import json_loads
+from config import get_settings
 
 
 class ChartHandler:
@@ -15,26 +17,24 @@ class ChartHandler:
     
     def __init__(self):
         # Chart-generating tools to monitor
-        self.chart_tools = [
+        self.chart_tools = frozenset({
             'create_chart_tool',
             'create_correlation_heatmap_tool',
             'create_time_series_chart_tool'
-        ]
+        })
         
         # Initialize session state for charts if needed
         self._init_session_state()
         
     def _init_session_state(self):
         """Initialize session state for chart storage"""
-        if 'generated_charts' not in st.session_state:
-            st.session_state.generated_charts = []
+        self._chart_store()
             
-        if 'chart_display_settings' not in st.session_state:
-            st.session_state.chart_display_settings = {
-                'height': 500,
-                'show_inline': True,
-                'expand_by_default': True
-            }
+        st.session_state.setdefault('chart_display_settings', {
+            'height': 500,
+            'show_inline': True,
+            'expand_by_default': True
+        })
             
     def detect_chart_in_response(
         self,
@@ -55,7 +55,7 @@ class ChartHandler:
             return None
             
         try:
-            result_data = json.loads(result)
+            result_data = json_loads(result)
             
             # Check for successful chart creation
             if result_data.get('success') and 'filepath' in result_data:
@@ -91,17 +91,24 @@ class ChartHandler:
         chart_data = {
             **chart_info,
             'html': html_content,
-            'id': f"chart_{int(time.time() * 1000)}",
+            'id': f"chart_{uuid.uuid4().hex[:12]}",
             'displayed': False
         }
         
-        st.session_state.generated_charts.append(chart_data)
-        
-        # Keep only last 20 charts to manage memory
-        if len(st.session_state.generated_charts) > 20:
-            st.session_state.generated_charts = st.session_state.generated_charts[-20:]
+        # Ring buffer - the oldest chart is dropped once the cap is reached
+        charts = self._chart_store()
+        charts.append(chart_data)
             
-        return len(st.session_state.generated_charts) - 1
+        return len(charts) - 1
+        
+    def _chart_store(self) -> deque:
+        """Get the chart ring buffer, (re)creating it if missing or sized for another cap"""
+        max_charts = get_settings().max_charts_stored
+        charts = st.session_state.get('generated_charts')
+        if not isinstance(charts, deque) or charts.maxlen != max_charts:
+            charts = deque(charts or (), maxlen=max_charts)
+            st.session_state.generated_charts = charts
+        return charts
         
     def display_chart(
         self,
@@ -129,7 +136,7 @@ class ChartHandler:
             
             with st.expander(title, expanded=expanded):
                 self._render_html_component(html_content, height, key)
-                self._add_chart_controls(html_content, title)
+                self._add_chart_controls(html_content, title, key or title)
         else:
             self._render_html_component(html_content, height, key)
             
@@ -173,88 +180,37 @@ class ChartHandler:
             
         return html_content
         
-    def _add_chart_controls(self, html_content: str, title: str):
-        """Add download and fullscreen controls"""
+    def _add_chart_controls(self, html_content: str, title: str, key: str):
+        """Add download and fullscreen controls (widget keys derive from the chart's key)"""
         
         col1, col2, col3 = st.columns([1, 1, 2])
         
         with col1:
             # Download button
-            b64 = base64.b64encode(html_content.encode()).decode()
             filename = f"{title.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.html"
-            
-            href = f'<a href="data:text/html;base64,{b64}" download="{filename}" style="text-decoration: none;"><button style="padding: 0.25rem 1rem; background-color: #FF4B4B; color: white; border: none; border-radius: 0.25rem; cursor: pointer;">📥 Download</button></a>'
-            st.markdown(href, unsafe_allow_html=True)
+            st.download_button(
+                label="📥 Download",
+                data=html_content,
+                file_name=filename,
+                mime="text/html",
+                key=f"{key}_download"
+            )
             
         with col2:
             # Fullscreen button
-            if st.button("🔍 Fullscreen", key=f"fs_{title}_{time.time()}"):
-                self._show_fullscreen_modal(html_content, title)
+            if st.button("🔍 Fullscreen", key=f"{key}_fullscreen"):
+                self._show_fullscreen_modal(html_content, title, key)
                 
-    def _show_fullscreen_modal(self, html_content: str, title: str):
+    def _show_fullscreen_modal(self, html_content: str, title: str, key: str):
         """Display chart in fullscreen modal"""
         
         modal = st.container()
         with modal:
-            if st.button("✕ Close", key=f"close_{time.time()}"):
+            if st.button("✕ Close", key=f"{key}_close"):
                 st.rerun()
             st.markdown(f"### {title}")
             components.html(html_content, height=800, scrolling=True)
             
-    def render_chart_gallery(self):
-        """Render gallery of all generated charts in sidebar"""
-        
-        if not st.session_state.generated_charts:
-            st.info("No charts generated yet")
-            return
-            
-        st.subheader("📊 Chart Gallery")
-        
-        # Display settings
-        with st.expander("Display Settings"):
-            st.session_state.chart_display_settings['height'] = st.slider(
-                "Chart Height",
-                300, 800, 
-                st.session_state.chart_display_settings['height'],
-                step=50
-            )
-            st.session_state.chart_display_settings['show_inline'] = st.checkbox(
-                "Show charts inline",
-                st.session_state.chart_display_settings['show_inline']
-            )
-            
-        # List charts (newest first)
-        for idx, chart in enumerate(reversed(st.session_state.generated_charts)):
-            time_str = chart['timestamp'].strftime('%H:%M:%S')
-            chart_name = f"{chart['chart_type']} - {time_str}"
-            
-            with st.expander(chart_name, expanded=False):
-                # Chart info
-                st.caption(f"📊 **Type:** {chart['chart_type']}")
-                st.caption(f"📈 **Data:** {chart.get('dataframe', 'N/A')}")
-                st.caption(f"🕒 **Created:** {chart['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}")
-                
-                # Metadata if available
-                if chart.get('metadata'):
-                    st.caption("**Metadata:**")
-                    for key, value in chart['metadata'].items():
-                        st.caption(f"  • {key}: {value}")
-                
-                # Action buttons
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    if st.button("View", key=f"view_{idx}_{chart['id']}"):
-                        st.session_state.current_chart_index = len(st.session_state.generated_charts) - idx - 1
-                        
-                with col2:
-                    # Download button
-                    b64 = base64.b64encode(chart['html'].encode()).decode()
-                    filename = f"{chart['chart_type']}_{chart['timestamp'].strftime('%Y%m%d_%H%M%S')}.html"
-                    
-                    href = f'<a href="data:text/html;base64,{b64}" download="{filename}">📥 Save</a>'
-                    st.markdown(href, unsafe_allow_html=True)
-                    
     def display_current_chart(self):
         """Display the currently selected chart in main area"""
         
@@ -285,7 +241,7 @@ class ChartHandler:
         
     def clear_charts(self):
         """Clear all stored charts"""
-        st.session_state.generated_charts = []
+        self._chart_store().clear()
         if 'current_chart_index' in st.session_state:
             del st.session_state.current_chart_index
             
@@ -317,11 +273,18 @@ class ChartHandler:
     def export_all_charts(self) -> Optional[str]:
         """Export all charts as a combined HTML file"""
         
-        if not st.session_state.generated_charts:
+        charts = st.session_state.generated_charts
+        if not charts:
             return None
             
-        # Create combined HTML
-        combined_html = """<!DOCTYPE html>
+        # Chart HTML never changes after storing, so the ids identify the export
+        body = _export_gallery(tuple(chart['id'] for chart in charts), _charts=tuple(charts))
+        # The export time is added outside the cache so each export shows its own
+        generated = f"    <p>Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>\n    <hr>\n"
+        return _GALLERY_HEAD + generated + body
+
+
+_GALLERY_HEAD = """<!DOCTYPE html>
 <html>
 <head>
     <meta charset="UTF-8">
@@ -336,12 +299,19 @@ class ChartHandler:
 </head>
 <body>
     <h1>Chart Gallery Export</h1>
-    <p>Generated: {timestamp}</p>
-    <hr>
-""".format(timestamp=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-        
-        for idx, chart in enumerate(st.session_state.generated_charts, 1):
-            chart_section = f"""
+"""
+
+_GALLERY_TAIL = """
+</body>
+</html>"""
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def _export_gallery(chart_ids: tuple, _charts: tuple) -> str:
+    """Build the gallery's chart sections and closing tags (cached by chart ids; _charts isn't hashed)"""
+    parts = []
+    for idx, chart in enumerate(_charts, 1):
+        parts.append(f"""
     <div class="chart-container">
         <div class="chart-header">
             <h2>Chart {idx}: {chart['chart_type'].title()}</h2>
@@ -354,11 +324,18 @@ class ChartHandler:
             {chart['html']}
         </div>
     </div>
-"""
-            combined_html += chart_section
-            
-        combined_html += """
-</body>
-</html>"""
-        
-        return combined_html
\ No newline at end of file
+""")
+    parts.append(_GALLERY_TAIL)
+    return "".join(parts)
+
+
+@st.cache_resource
+def _shared_chart_handler() -> ChartHandler:
+    return ChartHandler()
+
+
+def get_chart_handler() -> ChartHandler:
+    """Get the shared chart handler, making sure this session's chart state exists"""
+    handler = _shared_chart_handler()
+    handler._init_session_state()
+    return handler
@@ -0,0 +1,29 @@
+"""JSON helpers for pandas-chat-app - use orjson when it's installed"""
+
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def json_loads(data: Union[str, bytes]) -> Any:
+    """Parse JSON, raising json.JSONDecodeError on invalid input"""
+    if orjson is not None:
+        # orjson rejects str subclasses (e.g. ToolResult), so hand it a plain str
+        if isinstance(data, str) and type(data) is not str:
+            data = str(data)
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_dumps(obj: Any, indent: bool = False) -> str:
+    """Serialize to a JSON string, falling back to str() for unknown types"""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, option=option, default=str).decode()
+    return json.dumps(obj, indent=2 if indent else None, default=str)
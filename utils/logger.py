@@ -2,12 +2,16 @@
 
 import logging
 import json
+import os
 import sys
+from collections import deque
+from itertools import islice
 from pathlib import Path
 from datetime import datetime
 from typing import Dict, Any, Optional
 from logging.handlers import RotatingFileHandler
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 
 
 class AppLogger:
@@ -47,8 +51,8 @@ class AppLogger:
         )
         
         # Store recent logs for UI display
-        self.recent_logs = []
         self.max_recent = 100
+        self.recent_logs = deque(maxlen=self.max_recent)
         
     def _setup_logger(
         self,
@@ -170,15 +174,12 @@ class AppLogger:
         # Store for UI display
         self._add_recent("MCP", json.dumps(log_data, default=str))
         
-        # Update Streamlit session state if available
+        # Update Streamlit session state if available (not on the background loop)
         try:
-            if "tool_logs" not in st.session_state:
-                st.session_state.tool_logs = []
-            st.session_state.tool_logs.append(log_data)
-            
+            if get_script_run_ctx(suppress_warning=True) is None:
+                return
             # Keep only last 50 in session
-            if len(st.session_state.tool_logs) > 50:
-                st.session_state.tool_logs = st.session_state.tool_logs[-50:]
+            st.session_state.setdefault("tool_logs", deque(maxlen=50)).append(log_data)
         except:
             pass  # Session state not available
             
@@ -261,8 +262,6 @@ class AppLogger:
         }
         
         self.recent_logs.append(entry)
-        if len(self.recent_logs) > self.max_recent:
-            self.recent_logs.pop(0)
             
     def get_recent_logs(
         self,
@@ -271,16 +270,17 @@ class AppLogger:
     ) -> list:
         """Get recent log entries for UI display"""
         
-        logs = self.recent_logs[-count:]
+        logs = islice(self.recent_logs, max(len(self.recent_logs) - count, 0), None)
         
         if level_filter:
-            logs = [l for l in logs if l["level"] == level_filter.upper()]
+            level_filter = level_filter.upper()
+            return [l for l in logs if l["level"] == level_filter]
             
-        return logs
+        return list(logs)
         
     def clear_recent(self):
         """Clear recent logs buffer"""
-        self.recent_logs = []
+        self.recent_logs.clear()
         
     def get_log_stats(self) -> Dict[str, Any]:
         """Get logging statistics"""
@@ -304,25 +304,15 @@ class AppLogger:
         return stats
 
 
-# Global logger instance
-_logger = None
-
-
+@st.cache_resource
 def get_logger() -> AppLogger:
-    """Get or create the global logger instance"""
-    global _logger
+    """Get or create the global logger instance (shared across reruns)"""
+    # Get settings from environment or use defaults
+    log_level = os.getenv("LOG_LEVEL", "INFO")
+    log_dir = os.getenv("LOG_DIR", "logs")
     
-    if _logger is None:
-        # Get settings from environment or use defaults
-        import os
-        
-        log_level = os.getenv("LOG_LEVEL", "INFO")
-        log_dir = os.getenv("LOG_DIR", "logs")
-        
-        _logger = AppLogger(
-            name="pandas_chat",
-            log_dir=log_dir,
-            log_level=log_level
-        )
-        
-    return _logger
\ No newline at end of file
+    return AppLogger(
+        name="pandas_chat",
+        log_dir=log_dir,
+        log_level=log_level
+    )